@@ -0,0 +1,320 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+A local HTTP server which creates agendas, eg
+  http://localhost:8000/agenda.pdf?year=2024&paper=A4&format=weekon6pages
+The agendas are made by a pool of worker processes which stay alive between the requests,
+so reportlab is imported and the fonts are loaded once per worker.
+Finished pdf-files are kept in memory and in a cache directory, both least recently used first out.
+Run it from the directory of filofaxDIY.py (the title page needs gplv3.jpg).
+"""
+import io
+import os
+import locale
+import re
+import sys
+import time
+import argparse
+import datetime
+import threading
+import collections
+import urllib.parse
+import http.server
+import concurrent.futures
+import filofaxDIY
+
+formats = ('weekon2pages','weekon6pages')
+orients = ('Portrait','Landscape','Auto')
+languagepattern = re.compile(r'^[A-Za-z]{2,3}(_[A-Za-z]{2})?(\.[A-Za-z0-9-]+)?$')
+chunksize = 64 * 1024
+
+class memorycache:
+  """
+  The contents of the most recently used pdf-files, at most maxsize bytes in total
+
+  @ivar files: key -> contents, the least recently used first
+  @type files: C(collections.OrderedDict)
+  """
+  def __init__(self,maxsize):
+    self.maxsize = maxsize
+    self.size = 0
+    self.files = collections.OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self,key):
+    """
+    Return the contents of a file, or None when it is not in the cache
+
+    @rtype: C(bytes)
+    """
+    with self.lock:
+      if key not in self.files:
+        return None
+      self.files.move_to_end(key)
+      return self.files[key]
+
+  def put(self,key,contents):
+    """
+    Add a file, and forget the least recently used files when the cache is too large
+    """
+    if len(contents) > self.maxsize:
+      return
+    with self.lock:
+      if key in self.files:
+        self.size -= len(self.files.pop(key))
+      self.files[key] = contents
+      self.size += len(contents)
+      while self.size > self.maxsize:
+        oldkey,old = self.files.popitem(last=False)
+        self.size -= len(old)
+
+class requesterror(Exception):
+  """
+  A request which can not be served, with the HTTP status to answer
+  """
+  def __init__(self,status,message):
+    Exception.__init__(self,message)
+    self.status = status
+
+def parameters(query):
+  """
+  Return the parameters of makeagenda() for a query string, checked against the tables of filofaxDIY
+
+  @param query: The query of the url, eg year=2024&paper=A4
+  @type  query: C(str)
+
+  @return: The parameters of makeagenda, from year up to format
+  @rtype:  C(tuple)
+  """
+  fields = dict((name,values[-1]) for name,values in urllib.parse.parse_qs(query).items())
+  def choice(name,default,allowed):
+    value = fields.get(name,default)
+    if value not in allowed:
+      raise requesterror(400,"{name} must be one of {allowed}".format(name = name,allowed = ', '.join(sorted(allowed))))
+    return value
+  try:
+    year = int(fields.get('year',datetime.date.today().year + 1))
+    lineheight = int(fields.get('lineheight',4))
+  except ValueError:
+    raise requesterror(400,"year and lineheight must be numbers")
+  if not 1900 <= year <= 2100:
+    raise requesterror(400,"year must be between 1900 and 2100")
+  if not 0 <= lineheight <= 10:
+    raise requesterror(400,"lineheight must be between 0 and 10")
+  language = fields.get('language') or None
+  if language != None and not languagepattern.match(language):
+    raise requesterror(400,"language must be a locale name like nl_NL.UTF8")
+  return (year,language,choice('font','Helvetica',filofaxDIY.fonts),lineheight,choice('paper','A4',filofaxDIY.allowedpapers),
+          choice('orient','Portrait',orients),choice('filofax','Personal',filofaxDIY.agendasizes),choice('format','weekon2pages',formats))
+
+def generate(args,cachedir,cachesize):
+  """
+  Create one agenda in a worker process, in memory
+
+  @return: The contents of the pdf-file and the wall time in seconds, or None and the error
+  @rtype:  C((bytes, float))
+  """
+  try:
+    output,seconds = filofaxDIY.batchjob((args,{'output':io.BytesIO(),'cachedir':cachedir,'cachesize':cachesize}))
+    return output.getvalue(),seconds
+  except (ValueError,locale.Error) as error:     # agenda does not fit on the paper, or an unknown locale
+    return None,str(error)
+
+class agendaserver(http.server.ThreadingHTTPServer):
+  """
+  The HTTP server, with the worker processes and the caches shared by all requests
+
+  @ivar pool: The worker processes which create the agendas
+  @type pool: C(concurrent.futures.ProcessPoolExecutor)
+
+  @ivar slots: Limits the number of agendas made at the same time, other requests wait for a slot
+  @type slots: C(threading.BoundedSemaphore)
+
+  @ivar pending: key -> future of the agendas being made, equal requests wait for the same agenda
+  @type pending: C(dict)
+  """
+  daemon_threads = True
+
+  def __init__(self,address,workers=None,concurrency=None,cachedir='agendacache',cachesize=500,memorysize=64,queuetimeout=30,timeout=300):
+    http.server.ThreadingHTTPServer.__init__(self,address,agendahandler)
+    self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,initializer=filofaxDIY.warmup,initargs=('Helvetica',))
+    if concurrency == None:
+      concurrency = workers or os.cpu_count() or 1
+    self.slots = threading.BoundedSemaphore(concurrency)
+    self.cachedir = os.path.abspath(cachedir)
+    self.cachesize = cachesize
+    self.memory = memorycache(memorysize * 1024 * 1024)
+    self.pending = {}
+    self.lock = threading.Lock()
+    self.queuetimeout = queuetimeout
+    self.timeout = timeout
+
+  def agenda(self,args):
+    """
+    Return the pdf-file of an agenda, from the memory cache, or made by a worker
+    (which uses the cache directory)
+
+    @param args: The parameters of makeagenda
+    @type  args: C(tuple)
+
+    @return: The contents of the file, and where it came from
+    @rtype:  C((bytes, str))
+    """
+    contents = self.memory.get(args)
+    if contents != None:
+      return contents,'memory'
+    with self.lock:
+      future = self.pending.get(args)
+      owner = future == None
+      if owner:
+        future = concurrent.futures.Future()
+        self.pending[args] = future
+    if not owner:
+      return future.result(self.timeout),'shared'
+    try:
+      if not self.slots.acquire(timeout=self.queuetimeout):
+        raise requesterror(503,"too many agendas are being made, try again later")
+      try:
+        work = self.pool.submit(generate,args,self.cachedir,self.cachesize)
+      except BaseException:
+        self.slots.release()
+        raise
+      # the slot is free when the worker is done, not when the request times out and the worker is still drawing
+      work.add_done_callback(lambda work: self.slots.release())
+      contents,detail = work.result(self.timeout)
+      if contents == None:
+        raise requesterror(400,detail)
+      self.memory.put(args,contents)
+      future.set_result(contents)
+      return contents,'generated'
+    except BaseException as error:
+      future.set_exception(error)
+      raise
+    finally:
+      with self.lock:
+        del self.pending[args]
+
+  def server_close(self):
+    http.server.ThreadingHTTPServer.server_close(self)
+    self.pool.shutdown()
+
+form = """<!DOCTYPE html>
+<html><head><title>FilofaxDIY</title></head><body>
+<form action="agenda.pdf">
+<p>Year <input name="year" value="{year}"> Language <input name="language" placeholder="nl_NL.UTF8"></p>
+<p>Paper {paper} Orientation {orient} Agenda {filofax} Format {format} Font {font}
+Line height <input name="lineheight" value="4" size="2"></p>
+<p><input type="submit" value="Create"></p>
+</form></body></html>
+"""
+
+def select(name,values,default):
+  """
+  Return the html of a select element
+  """
+  options = ''.join('<option{selected}>{value}</option>'.format(value = value,selected = ' selected' if value == default else '')
+                    for value in sorted(values))
+  return '<select name="{name}">{options}</select>'.format(name = name,options = options)
+
+class agendahandler(http.server.BaseHTTPRequestHandler):
+  """
+  Answer a request: / is the form, /agenda.pdf is an agenda
+  """
+  protocol_version = 'HTTP/1.1'    # for chunked responses
+
+  def do_GET(self):
+    start = time.perf_counter()
+    url = urllib.parse.urlsplit(self.path)
+    source = '-'
+    size = 0
+    try:
+      if url.path == '/':
+        page = form.format(year = datetime.date.today().year + 1,paper = select('paper',filofaxDIY.allowedpapers,'A4'),
+                           orient = select('orient',orients,'Portrait'),filofax = select('filofax',filofaxDIY.agendasizes,'Personal'),
+                           format = select('format',formats,'weekon2pages'),font = select('font',filofaxDIY.fonts,'Helvetica'))
+        status = 200
+        size = self.answer(200,'text/html; charset=utf-8',page.encode('utf-8'))
+      elif url.path == '/agenda.pdf':
+        args = parameters(url.query)
+        contents,source = self.server.agenda(args)
+        status = 200
+        size = self.answer(200,'application/pdf',contents,filename = "{size}_{year}_{locale}_{format}.pdf".format(
+                             size = args[6],year = args[0],locale = args[1],format = args[7]))
+      else:
+        raise requesterror(404,"not found")
+    except requesterror as error:
+      status = error.status
+      size = self.answer(status,'text/plain; charset=utf-8',(str(error) + '\n').encode('utf-8'))
+    except concurrent.futures.TimeoutError:
+      status = 504
+      size = self.answer(status,'text/plain; charset=utf-8',b'the agenda took too long\n')
+    except Exception as error:     # eg the cache directory can not be written
+      status = 500
+      self.log_message('"%s" %s: %s',self.requestline,type(error).__name__,error)
+      size = self.answer(status,'text/plain; charset=utf-8',b'the agenda could not be made\n')
+    self.log_message('"%s" %d %d %s %.3fs',self.requestline,status,size,source,time.perf_counter() - start)
+
+  def answer(self,status,contenttype,contents,filename=None):
+    """
+    Send a response, the contents in chunks
+
+    @return: The number of bytes of the contents
+    @rtype:  C(int)
+    """
+    self.send_response_only(status)
+    self.send_header('Date',self.date_time_string())
+    self.send_header('Content-Type',contenttype)
+    self.send_header('Transfer-Encoding','chunked')
+    if filename != None:
+      self.send_header('Content-Disposition','inline; filename="{0}"'.format(filename))
+    if status == 503:
+      self.send_header('Retry-After','10')
+    self.end_headers()
+    view = memoryview(contents)
+    for offset in range(0,len(view),chunksize):
+      chunk = view[offset:offset + chunksize]
+      self.wfile.write("{0:x}\r\n".format(len(chunk)).encode('ascii'))
+      self.wfile.write(chunk)
+      self.wfile.write(b'\r\n')
+    self.wfile.write(b'0\r\n\r\n')
+    return len(contents)
+
+  def log_request(self,code='-',size='-'):
+    pass     # do_GET logs the request, with its time
+
+  def log_message(self,format,*args):
+    sys.stderr.write("{time} {client} {message}\n".format(time = self.log_date_time_string(),client = self.address_string(),message = format % args))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Serve FilofaxDIY printable agendas over HTTP')
+  parser.add_argument('--host',default='localhost',help='address to listen on (default localhost)')
+  parser.add_argument('--port',default=8000,type=int)
+  parser.add_argument('--workers',type=int,help='number of worker processes (default one per core)')
+  parser.add_argument('--concurrency',type=int,help='number of agendas made at the same time (default the number of workers)')
+  parser.add_argument('--cache',metavar='DIR',default='agendacache',help='directory of the pdf-file cache')
+  parser.add_argument('--cachesize',metavar='MB',default=500,type=int,help='maximum size of the cache directory (default 500 MB)')
+  parser.add_argument('--memory',metavar='MB',default=64,type=int,help='maximum size of the pdf-files kept in memory (default 64 MB)')
+  args = parser.parse_args()
+
+  server = agendaserver((args.host,args.port),args.workers,args.concurrency,args.cache,args.cachesize,args.memory)
+  print("serving on http://{host}:{port}/".format(host = args.host,port = args.port),file=sys.stderr)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
@@ -0,0 +1,212 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Measure the speed of the drawing libraries and of creating complete agendas.
+Run it from the directory of filofaxDIY.py (the title page needs gplv3.jpg).
+The results are written as JSON, so two versions can be compared.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from xfiglib import pdfout
+from xfiglib import xfig
+from reportlab.pdfgen import canvas
+import filofaxDIY
+
+def measure(name,func,repeat,traced=True,**params):
+  """
+  Run a benchmark: the best wall time of a number of runs, and the peak memory of one extra run
+  (tracemalloc makes that run slower, so it is not timed)
+
+  @param name: The name of the benchmark
+  @type  name: C(str)
+
+  @param func: The benchmark, called without parameters. It returns the number of bytes written, or None
+  @type  func: C(callable)
+
+  @param repeat: The number of timed runs
+  @type  repeat: C(int)
+
+  @param traced: Measure the peak memory. tracemalloc only sees this interpreter,
+                 so the peak memory of a benchmark which runs in a subprocess is None
+  @type  traced: C(bool)
+
+  @param params: The parameters of the benchmark, to put in the result
+  @type  params: C(dict)
+
+  @return: The result
+  @rtype:  C(dict)
+  """
+  times = []
+  outputbytes = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    outputbytes = func()
+    times.append(time.perf_counter() - start)
+  peak = None
+  if traced:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  result = {'name':name,'params':params,'seconds':min(times),'times':times,'peakmemory':peak,'outputbytes':outputbytes}
+  print("{name:20} {params} {seconds:.4f}s {peak}".format(name = name,params = params,seconds = min(times),
+                                                             peak = '-' if peak is None else '{0}B'.format(peak)),file=sys.stderr)
+  return result
+
+def pdfoutbuffer(n):
+  """
+  Buffer n lines, texts and circles in a pdfout
+
+  @rtype: C(pdfout.pdfout)
+  """
+  page = pdfout.pdfout(210,297)
+  for i in range(n):
+    page.line(10,i % 280,100,0,2,0.5)
+    page.tekst(10,i % 280,"Monday",'Helvetica',9,0)
+    page.circle(5,i % 280,2.75,1,2)
+  return page
+
+def pdfoutsave(n,directory):
+  """
+  Buffer n lines, texts and circles in a pdfout, and replay them to a pdf
+
+  @return: The size of the pdf
+  @rtype:  C(int)
+  """
+  filename = os.path.join(directory,'pdfout.pdf')
+  pdf = canvas.Canvas(filename,pageCompression=1,verbosity=0)
+  pdfoutbuffer(n).save(pdf)
+  pdf.save()
+  return os.path.getsize(filename)
+
+def xfigsave(n,directory):
+  """
+  Draw n lines and texts with xfig, and write the fig-file
+
+  @return: The size of the fig-file
+  @rtype:  C(int)
+  """
+  filename = os.path.join(directory,'xfig.fig')
+  fig = xfig.xfig("A4")
+  for i in range(n):
+    fig.line(10,i % 280,100,0,2,1)
+    fig.tekst(10,i % 280,"Monday")
+    fig.writeline("# comment")
+  fig.save(filename)
+  return os.path.getsize(filename)
+
+def formfeeds(n,directory,paper):
+  """
+  Feed n agenda pages, without drawing on them
+
+  @return: The size of the pdf
+  @rtype:  C(int)
+  """
+  filename = os.path.join(directory,'formfeed.pdf')
+  agenda = filofaxDIY.filofax(None,'Helvetica',4,filofaxDIY.allowedpapers[paper],'Portrait',filename,filofaxDIY.agendasizes['Personal'])
+  for i in range(n):
+    agenda.formfeed()
+  agenda.close()
+  return os.path.getsize(filename)
+
+def year(directory,paper,filofaxsize,format):
+  """
+  Create the agenda of a complete year
+
+  @return: The size of the pdf
+  @rtype:  C(int)
+  """
+  filename = os.path.join(directory,'year.pdf')
+  filofaxDIY.makeagenda(2015,None,'Helvetica',4,paper,'Portrait',filofaxsize,format,filename)
+  return os.path.getsize(filename)
+
+def startup(args):
+  """
+  Start filofaxDIY.py in a new interpreter, eg with --help
+
+  @param args: The arguments of the interpreter after its name
+  @type  args: C([str])
+  """
+  subprocess.run([sys.executable] + args,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+
+def revision():
+  """
+  Return the git revision of the source, if it is known
+
+  @rtype: C(str)
+  """
+  try:
+    return subprocess.check_output(['git','rev-parse','HEAD'],stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError,subprocess.CalledProcessError):
+    return None
+
+def runall(repeat,quick):
+  """
+  Run all benchmarks
+
+  @param repeat: The number of timed runs of every benchmark
+  @type  repeat: C(int)
+
+  @param quick: Only create agendas on A4
+  @type  quick: C(bool)
+
+  @return: The results
+  @rtype:  C([dict])
+  """
+  results = []
+  results.append(measure('startup.import',lambda: startup(['-c','import filofaxDIY']),repeat,traced=False))
+  results.append(measure('startup.help',lambda: startup(['filofaxDIY.py','--help']),repeat,traced=False))
+  results.append(measure('startup.wrongargument',lambda: startup(['filofaxDIY.py','--paper','A9']),repeat,traced=False))
+  with tempfile.TemporaryDirectory() as directory:
+    for n in (1000,10000):
+      results.append(measure('pdfout.buffer',lambda: pdfoutbuffer(n) and None,repeat,n=n))
+      results.append(measure('pdfout.save',lambda: pdfoutsave(n,directory),repeat,n=n))
+      results.append(measure('xfig.save',lambda: xfigsave(n,directory),repeat,n=n))
+    for paper in ('A4','A0'):
+      results.append(measure('filofax.formfeed',lambda: formfeeds(1000,directory,paper),repeat,n=1000,paper=paper))
+    papers = ('A4',) if quick else ('A4','letter','A3','A0')
+    for paper in papers:
+      for filofaxsize in filofaxDIY.agendasizes:
+        for format in ('weekon2pages','weekon6pages'):
+          try:
+            results.append(measure('year',lambda: year(directory,paper,filofaxsize,format),repeat,paper=paper,filofax=filofaxsize,format=format))
+          except ValueError as error:    # agenda does not fit on the paper
+            print("year {paper} {filofax} {format}: {error}".format(paper = paper,filofax = filofaxsize,format = format,error = error),file=sys.stderr)
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark FilofaxDIY, results are written as JSON')
+  parser.add_argument('--output',default='-',help='file for the JSON results (default stdout)')
+  parser.add_argument('--repeat',default=3,type=int,help='number of timed runs of every benchmark')
+  parser.add_argument('--quick',action='store_true',help='only create agendas on A4 paper')
+  args = parser.parse_args()
+
+  report = {'revision':revision(),'python':platform.python_version(),'platform':platform.platform(),
+            'results':runall(args.repeat,args.quick)}
+  if args.output == '-':
+    json.dump(report,sys.stdout,indent=1)
+    print()
+  else:
+    with open(args.output,'w') as f:
+      json.dump(report,f,indent=1)
@@ -18,18 +18,187 @@
 """
 import locale
 import datetime
+import array
+import collections
 from xfiglib import pdfout    # name is not logical
+from xfiglib import backend
+from xfiglib import nullout
+import outputcache
+import icscalendar
+import specialdays
 import argparse
-from reportlab.pdfgen import canvas
-import reportlab.lib.pagesizes
-from reportlab.lib.units import cm
+import itertools
+import time
+import sys
+import os
+import io
+import contextlib
+import cProfile
+import glob
+import hashlib
+# reportlab, xfig, svgout and concurrent.futures are imported where they are used, so importing
+# this module, --help and wrong arguments do not wait for them
+
+# the units of reportlab (1/72"), as in reportlab.lib.units
+inch = 72.0
+cm = inch / 2.54
+mm = cm * 0.1
 
 FILOFAXDIYVERSION="https://github.com/tofkamp/filofax-diy"    # should be from versioning system, but how can I do this ????
+documentinfo = ('T.Hofkamp',FILOFAXDIYVERSION,'Agenda','FilofaxDIY printable agenda')    # author, creator, title, subject
+
+class phasetimer:
+  """
+  Measure how much time is spent in the phases of creating an agenda. A phase can contain
+  other phases, their time is not counted in the outer phase.
+
+  @ivar seconds: The time per phase, without the time of the inner phases
+  @type seconds: C({str: float})
+
+  @ivar counts: How often a phase was started
+  @type counts: C({str: int})
+
+  @ivar amounts: Other measurements, eg the bytes per page, all values per name
+  @type amounts: C({str: [int]})
+  """
+  def __init__(self):
+    self.seconds = collections.OrderedDict()
+    self.counts = collections.OrderedDict()
+    self.amounts = collections.OrderedDict()
+    self.stack = []     # [start, time of inner phases] per running phase
+
+  @contextlib.contextmanager
+  def phase(self,name):
+    """
+    Measure the code in a with statement as phase name
+
+    @param name: The name of the phase
+    @type  name: C(str)
+    """
+    self.stack.append([time.perf_counter(),0.0])
+    try:
+      yield
+    finally:
+      start,inner = self.stack.pop()
+      elapsed = time.perf_counter() - start
+      if self.stack:
+        self.stack[-1][1] += elapsed
+      self.seconds[name] = self.seconds.get(name,0.0) + elapsed - inner
+      self.counts[name] = self.counts.get(name,0) + 1
+
+  def amount(self,name,value):
+    """
+    Add a measurement which is not a time, eg the size of a page
+
+    @param name: The name of the measurement
+    @type  name: C(str)
+
+    @param value: The measured value
+    @type  value: C(int)
+    """
+    self.amounts.setdefault(name,[]).append(value)
+
+  def report(self,out=sys.stderr):
+    """
+    Print the time per phase
+
+    @param out: The file to print to
+    @type  out: C(file)
+    """
+    total = sum(self.seconds.values())
+    for name,seconds in self.seconds.items():
+      print("{name:15} {count:6} x {seconds:8.3f}s {percent:5.1f}%".format(name = name,count = self.counts[name],seconds = seconds,
+                                                                         percent = 100.0 * seconds / total if total else 0.0),file=out)
+    print("{name:15} {count:6}   {seconds:8.3f}s".format(name = 'total',count = '',seconds = total),file=out)
+    for name,values in self.amounts.items():
+      print("{name:15} {count:6} x {total:9d} (min {low}, average {average:.0f}, max {high})".format(name = name,count = len(values),
+            total = sum(values),low = min(values),average = sum(values) / float(len(values)),high = max(values)),file=out)
+
+calendarday = collections.namedtuple('calendarday','mday weekday yday year month week')
+
+class calendartable:
+  """
+  The names and numbers of all days in a range of dates, as shown in the agenda,
+  in the current LC_TIME locale. strftime() is only used for the 7 weekday names
+  and the 12 month names, the rest is computed.
+
+  @ivar first: The first day in the table
+  @type first: C(datetime.date)
+
+  @ivar days: The calendarday of every day, starting with first
+  @type days: C([calendarday])
+  """
+  def __init__(self,first,last):
+    monday = first - first.weekday() * datetime.date.resolution
+    weekdays = [(monday + i * datetime.date.resolution).strftime("%A") for i in range(7)]
+    months = [datetime.date(2000,month,1).strftime("%B") for month in range(1,13)]
+    self.first = first
+    self.days = []
+    day = first
+    while day <= last:
+      yday = day.timetuple().tm_yday
+      weekday = day.weekday()
+      self.days.append(calendarday(str(day.day),weekdays[weekday],"{0:03d}".format(yday),str(day.year),months[day.month - 1],
+                                   "WEEK {0:02d}".format((yday + 6 - weekday) // 7)))    # weeknumber like %W
+      day += datetime.date.resolution
+
+  def day(self,day):
+    """
+    Return the names of a day
+
+    @param day: The day to look up
+    @type  day: C(datetime.date)
+
+    @rtype: C(calendarday)
+    """
+    return self.days[(day - self.first).days]
+
+calendartables = {}    # (locale,first,last) -> calendartable, shared by all agendas made in this process
+
+def getcalendartable(first,last):
+  """
+  Return the calendartable for the range of days in the current LC_TIME locale, made only once
+
+  @param first: The first day in the table
+  @type  first: C(datetime.date)
+
+  @param last: The last day in the table
+  @type  last: C(datetime.date)
+
+  @rtype: C(calendartable)
+  """
+  key = (locale.setlocale(locale.LC_TIME),first,last)
+  if key not in calendartables:
+    calendartables[key] = calendartable(first,last)
+  return calendartables[key]
 
 class filofax:
-  def __init__(self,language,font,lineheight,paper,orient,filename,filofax):
-    if language != None:
-      locale.setlocale(locale.LC_TIME,language)
+  def __init__(self,language,font,lineheight,paper,orient,filename,filofax,document=None,margin=0,signature=0):
+    """
+    @param paper: The size of the paper (width,height) in 1/72", in any orientation
+    @type  paper: C((float, float))
+
+    @param orient: 'Portrait' or 'Landscape'
+    @type  orient: C(str)
+
+    @param filename: The name of the pdf-file or a binary stream, when no document is given
+    @type  filename: C(str)
+
+    @param filofax: Size of the agenda, see agendasizes
+    @type  filofax: C(tuple)
+
+    @param document: The output, by default a pdf-file
+    @type  document: L(backend.document)
+
+    @param margin: The minimal space between the agenda pages and the edge of the paper in mm
+    @type  margin: C(float)
+
+    @param signature: Number of agenda pages per signature (a multiple of 4), 0 to cut the papers in single pages.
+                      The folios of a signature (two agenda pages next to each other, on both sides) are folded
+                      once and put in each other, see layout().
+    @type  signature: C(int)
+    """
+    locale.setlocale(locale.LC_TIME,language or 'C')    # back to the default without a language, a worker process may have used another one before
     #statics
     self.font= font    # which font to use
     self.headerfont=self.font    # header font will be the same
@@ -39,6 +208,8 @@ class filofax:
     self.mdayfsize=19
     self.dayofweekfont=self.font   # name of the weekday font (eg monday)
     self.dayofweekfsize=9
+    self.eventfont=self.font   # holidays and events from ics-files, written on the lines of a day
+    self.eventfsize=7
 
     #self.agendawidth=95.0
     #self.agendaheight=171.0
@@ -48,16 +219,12 @@ class filofax:
     self.holesoffset = filofax[3]  # offset from middle
     self.holesstep = filofax[4]   # space between holes
     self.lineheight = lineheight  # space between lines in one agenda day
-    # create the reportlab pdf stream
-    self.canvas = canvas.Canvas(filename,pageCompression=1,verbosity=0)    #,pagesize=A4,bottumup = 0,pageCompression=0,
-    if orient == 'Portrait':
-      self.canvas.setPageSize(reportlab.lib.pagesizes.portrait(paper))
-    else:
-      self.canvas.setPageSize(reportlab.lib.pagesizes.landscape(paper))
-    self.canvas.setAuthor('T.Hofkamp')
-    self.canvas.setCreator(FILOFAXDIYVERSION)
-    self.canvas.setTitle('Agenda')
-    self.canvas.setSubject('FilofaxDIY printable agenda')
+    pagesize = orientation(paper,orient)
+    # create the reportlab pdf stream, when there is no other output
+    if document == None:
+      document = pdfout.pdfdocument(filename,pagesize)
+    self.document = document
+    self.document.setinfo(*documentinfo)
      
     """
     personal  95x171    holes 5.5mm at 5mm from edge at 26,45,64mm from midle
@@ -81,10 +248,11 @@ class filofax:
     self.cutlinesy = (19.5,190.5)
     """
     
-    self.paperwidth = self.canvas._pagesize[0] * 10 / cm          # calculate the width in mm from the choosen paper parameter
-    self.paperheight = self.canvas._pagesize[1] * 10 / cm         # calculate the height in mm from the choosen paper parameter
-    xcount = int(self.paperwidth / self.agendawidth)
-    ycount = int(self.paperheight / self.agendaheight)
+    self.paperwidth = pagesize[0] * 10 / cm          # calculate the width in mm from the choosen paper parameter
+    self.paperheight = pagesize[1] * 10 / cm         # calculate the height in mm from the choosen paper parameter
+    xcount,ycount = checkfit(pagesize,filofax,margin,signature)
+    self.signature = signature
+    self.xcount = xcount
     self.agendapagesperpage = xcount * ycount
     # assert(self.agendapagesperpage > 0)
     startx = (self.paperwidth - xcount * self.agendawidth) / 2.0    # where does the first agendapage start
@@ -107,11 +275,46 @@ class filofax:
     self.currentonevenpage = False    # true or false,depending on which side of paper
     self.currentagendapage = self.agendapagesperpage - 1   # point to last agenda page
     # because reportlab pdf, cannot write to two pages at the same time, all draw actions are bufferd
-    # with pdfout object, evenpage and oddpage contains the buffered draw action
-    self.evenpage = None     # the buffers
-    self.oddpage = None
-    self.currentpage = self.oddpage   # point to the current object for buffering
+    # with pdfout objects, sheets contains the buffered draw actions of both sides of the papers being filled
+    self.currentpagenr = -1   # the number of the current agenda page, see layout()
+    self.layout(0)
+    self.sheets = {}         # number of the paper -> [evenpage, oddpage], the buffers
+    self.pagesleft = {}      # number of the paper -> agenda pages on it which are not done yet
+    self.nextsheet = 0       # the number of the first paper which is not written yet
+    self.currentpage = None   # point to the current object for buffering
+    self.calendar = None     # calendartable with the names of the days, see setyear()
+    self.events = None       # icscalendar.calendar with the events to write on the days, see setevents()
+    self.holidays = None     # specialdays.holidays of the country of the locale, None for no holidays
+    country = specialdays.localecountry(language)
+    if country != None:
+      self.holidays = specialdays.holidays(country,language)
+    self.timer = phasetimer()    # time spent per phase
     
+  def setyear(self,year):
+    """
+    Prepare the names of all days which can be shown in the agenda of the year, from the monday
+    before new years day until the sunday after new years eve.
+
+    @param year: The year for which the agenda is created
+    @type  year: C(int)
+    """
+    first = datetime.date(year,1,1)
+    first -= first.weekday() * datetime.date.resolution
+    last = datetime.date(year,12,31)
+    last += (6 - last.weekday()) * datetime.date.resolution
+    self.calendar = getcalendartable(first,last)
+
+  def setevents(self,filenames):
+    """
+    Read the events of ics-files, for the days of the year set by setyear()
+
+    @param filenames: The ics-files
+    @type  filenames: C([str])
+    """
+    first = self.calendar.first
+    last = first + (len(self.calendar.days) - 1) * datetime.date.resolution
+    self.events = icscalendar.calendar(filenames,first,last)
+
   def titlepage(self,year):
     """
     Make the title page
@@ -148,30 +351,126 @@ class filofax:
     @param width: The height to draw the day in (mm)
     @param width: C(float)
     """
-    leftindent = 0
-    rightindent = 0
+    names = self.calendar.day(day)
     if self.currentonevenpage:
       # evenpage,when holes are on left
-      self.currentpage.tekst(width,5,str(int(day.strftime("%d"))),self.mdayfont,self.mdayfsize,2)  #day of the month
-      self.currentpage.tekst(width - 10,3,day.strftime("%A"),self.dayofweekfont,self.dayofweekfsize,2)  # day of the week
-      self.currentpage.tekst(0,3,day.strftime("%j"),self.dayofweekfont,self.dayofweekfsize,0)
-      rightindent = 10
+      self.currentpage.tekst(width,5,names.mday,self.mdayfont,self.mdayfsize,2)  #day of the month
+      self.currentpage.tekst(width - 10,3,names.weekday,self.dayofweekfont,self.dayofweekfsize,2)  # day of the week
+      self.currentpage.tekst(0,3,names.yday,self.dayofweekfont,self.dayofweekfsize,0)
     else:
       # oddpage,when holes are on right
-      self.currentpage.tekst(0,5,str(int(day.strftime("%d"))),self.mdayfont,self.mdayfsize,0)
-      self.currentpage.tekst(10,3,day.strftime("%A"),self.dayofweekfont,self.dayofweekfsize,0)
-      self.currentpage.tekst(width,3,day.strftime("%j"),self.dayofweekfont,self.dayofweekfsize,2)
+      self.currentpage.tekst(0,5,names.mday,self.mdayfont,self.mdayfsize,0)
+      self.currentpage.tekst(10,3,names.weekday,self.dayofweekfont,self.dayofweekfsize,0)
+      self.currentpage.tekst(width,3,names.yday,self.dayofweekfont,self.dayofweekfsize,2)
+    even = self.currentonevenpage
+    self.currentpage.placetemplate(('day',height,width,self.lineheight,even),lambda template: self.drawdaylines(template,height,width,even))
+    labels = []
+    if self.holidays != None:
+      label = self.holidays.label(day)
+      if label != None:
+        labels.append(label)
+    if self.events != None:
+      labels.extend(self.events.day(day))
+    if labels:
+      self.drawlabels(labels,height,width,even)
+
+  def drawlabels(self,labels,height,width,even):
+    """
+    Write the holiday and the events of a day on its lines, starting at the second line (the first is next to the names of the day).
+    Texts which are too long are cut off, when there are more texts than lines the last line tells how many are not shown.
+
+    @param labels: The texts, one per line
+    @type  labels: C([str])
+
+    @param height: The height of the day (mm)
+    @param height: C(float)
+
+    @param width: The width of the day (mm)
+    @param width: C(float)
+
+    @param even: True on an even page, where the lines next to the names are shorter on the right side
+    @type  even: C(bool)
+    """
+    import reportlab.pdfbase.pdfmetrics
+    step = self.lineheight
+    if step == 0:     # no lines, use the spacing of the default lineheight
+      step = 4
+    rows = []
+    i = 6 + step
+    while i + step < height - 2:
+      if i > 10:
+        rows.append((i,0,width))
+      elif even:
+        rows.append((i,0,width - 10))
+      else:
+        rows.append((i,10,width - 10))
+      i = i + step
+    if len(labels) > len(rows) and rows:
+      hidden = len(labels) - len(rows) + 1
+      labels = labels[:len(rows) - 1] + ["+{0}".format(hidden)]
+    for (y,x,linewidth),label in zip(rows,labels):
+      maxwidth = (linewidth - 1) * 72 / 25.4    # in 1/72"
+      while label and reportlab.pdfbase.pdfmetrics.stringWidth(label,self.eventfont,self.eventfsize) > maxwidth:
+        label = label[:-1]
+      self.currentpage.tekst(x + 0.5,y - 0.7,label,self.eventfont,self.eventfsize,0)
+
+  def drawdaylines(self,paper,height,width,even):
+    """
+    Draw the lines of one day, without the texts. This is the same for every day with the same size,
+    so it is drawn once as a template by drawday()
+
+    @param paper: Object pdfout, with the origin on top left of the day
+    @type  paper: L(pdfout.pdfout)
+
+    @param height: The height to draw the day in (mm)
+    @param height: C(float)
+
+    @param width: The height to draw the day in (mm)
+    @param width: C(float)
+
+    @param even: True on an even page, leave room for the texts on the right side instead of the left side
+    @type  even: C(bool)
+    """
+    leftindent = 0
+    rightindent = 0
+    if even:
+      rightindent = 10
+    else:
       leftindent = 10
     if self.lineheight > 0:
       i = 6
       while i + self.lineheight < height - 2:
-        self.currentpage.line(leftindent,i,width-leftindent-rightindent,0,2,0.5)
+        paper.line(leftindent,i,width-leftindent-rightindent,0,2,0.5)
         i = i + self.lineheight
         if i > 10:
           leftindent = 0
           rightindent = 0
-    self.currentpage.line(0,height - 2,width,0,0,2)
-  
+    paper.line(0,height - 2,width,0,0,2)
+
+  def header(self,day,width):
+    """
+    Draw the header on top of the agenda page: year, month and weeknumber, mirrored on an even page
+
+    @param day: The first day on the agenda page
+    @type  day: C(datetime.date)
+
+    @param width: The width of the header (mm)
+    @param width: C(float)
+    """
+    names = self.calendar.day(day)
+    week = names.week
+    if self.holidays != None:    # the week numbers of the country
+      week = "WEEK {0:02d}".format(self.holidays.week(day))
+    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
+    if self.currentonevenpage:
+      self.currentpage.tekst(width,7,names.year,self.headerfont,self.headerfsize,2)    #year
+      self.currentpage.tekst(width - 10,7,names.month,self.headerfont,self.headerfsize,2)     # month
+      self.currentpage.tekst(0,7,week,self.headerfont,self.headerfsize,0)  # weeknr
+    else:
+      self.currentpage.tekst(0,7,names.year,self.headerfont,self.headerfsize,0)    #year
+      self.currentpage.tekst(10,7,names.month,self.headerfont,self.headerfsize,0)     # month
+      self.currentpage.tekst(width,7,week,self.headerfont,self.headerfsize,2)  # weeknr
+
   def weekon2pages(self,day):
     """
     @param day: C(datetime.date)
@@ -188,10 +487,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.outermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(0,7,day.strftime("%Y"),self.headerfont,self.headerfsize,0)    #year
-    self.currentpage.tekst(10,7,day.strftime("%B"),self.headerfont,self.headerfsize,0)     # month
-    self.currentpage.tekst(width,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,2)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # monday
@@ -213,10 +509,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.innermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(width,7,day.strftime("%Y"),self.headerfont,self.headerfsize,2)    #year
-    self.currentpage.tekst(width - 10,7,day.strftime("%B"),self.headerfont,self.headerfsize,2)     # month
-    self.currentpage.tekst(0,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,0)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # thursday
@@ -259,10 +552,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.outermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(0,7,day.strftime("%Y"),self.headerfont,self.headerfsize,0)    #year
-    self.currentpage.tekst(10,7,day.strftime("%B"),self.headerfont,self.headerfsize,0)     # month
-    self.currentpage.tekst(width,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,2)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # monday
@@ -273,10 +563,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.innermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(width,7,day.strftime("%Y"),self.headerfont,self.headerfsize,2)    #year
-    self.currentpage.tekst(width - 10,7,day.strftime("%B"),self.headerfont,self.headerfsize,2)     # month
-    self.currentpage.tekst(0,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,0)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # tuesday
@@ -288,10 +575,7 @@ class filofax:
     self.formfeed()
     self.currentpage.pushorigin(self.outermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(0,7,day.strftime("%Y"),self.headerfont,self.headerfsize,0)    #year
-    self.currentpage.tekst(10,7,day.strftime("%B"),self.headerfont,self.headerfsize,0)     # month
-    self.currentpage.tekst(width,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,2)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # wednesday
@@ -302,10 +586,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.innermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(width,7,day.strftime("%Y"),self.headerfont,self.headerfsize,2)    #year
-    self.currentpage.tekst(width - 10,7,day.strftime("%B"),self.headerfont,self.headerfsize,2)     # month
-    self.currentpage.tekst(0,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,0)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # thurseday
@@ -317,10 +598,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.outermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(0,7,day.strftime("%Y"),self.headerfont,self.headerfsize,0)    #year
-    self.currentpage.tekst(10,7,day.strftime("%B"),self.headerfont,self.headerfsize,0)     # month
-    self.currentpage.tekst(width,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,2)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # friday
@@ -331,10 +609,7 @@ class filofax:
 
     self.currentpage.pushorigin(self.innermargin,0)
     # header
-    self.currentpage.line(0,self.headerheight - 2,width,0,0,2)
-    self.currentpage.tekst(width,7,day.strftime("%Y"),self.headerfont,self.headerfsize,2)    #year
-    self.currentpage.tekst(width - 10,7,day.strftime("%B"),self.headerfont,self.headerfsize,2)     # month
-    self.currentpage.tekst(0,7,day.strftime("WEEK %W"),self.headerfont,self.headerfsize,0)  # weeknr
+    self.header(day,width)
 
     self.currentpage.pushorigin(0,self.headerheight)
     # saturday
@@ -347,29 +622,35 @@ class filofax:
     self.currentpage.poporigin()
     self.currentpage.poporigin()
 
-  def punchholes(self):
+  def punchholes(self,paper,even):
     """ Draw the punch hole on one agenda page
     Using parameter self.nrholes,holestep and holeoffset. This defines just the half of the holes, from the middle.
     Because holes are mirrored to the center. nrholes is the half of the total number of holes, rounded UP
     If holeoffset = 0, just one hole is draw
+
+    @param paper: Object pdfout, with the origin on top left of the agenda page
+    @type  paper: L(pdfout.pdfout)
+
+    @param even: True for an even page (holes on the left side)
+    @type  even: C(bool)
     """
     # origin is top left of page
     # maybe a parameter which kind of holes 1,2,3,4
     middle = self.agendaheight/2
-    if self.currentonevenpage:
-      self.currentpage.line(10,middle,5,0,2)
+    if even:
+      paper.line(10,middle,5,0,2)
     else:
-      self.currentpage.line(self.agendawidth-10,middle,-5,0,2)
+      paper.line(self.agendawidth-10,middle,-5,0,2)
     for i in range(self.nrholes):
       hole = i*self.holesstep+self.holesoffset
-      if self.currentonevenpage:
-        self.currentpage.circle(5,middle+hole,2.75,1,2)    # hole 5.5mm on the left side
+      if even:
+        paper.circle(5,middle+hole,2.75,1,2)    # hole 5.5mm on the left side
         if hole > 0:
-          self.currentpage.circle(5,middle-hole,2.75,1,2)
+          paper.circle(5,middle-hole,2.75,1,2)
       else:
-        self.currentpage.circle(self.agendawidth-5,middle+hole,2.75,1,2)   # holes on the right side
+        paper.circle(self.agendawidth-5,middle+hole,2.75,1,2)   # holes on the right side
         if hole > 0:
-          self.currentpage.circle(self.agendawidth-5,middle-hole,2.75,1,2)
+          paper.circle(self.agendawidth-5,middle-hole,2.75,1,2)
 
   def drawcutlines(self,paper):
     """
@@ -385,34 +666,162 @@ class filofax:
     for y in self.cutlinesy:
       paper.line(self.cutlinesx[0]-self.cutlinelength/2,y,self.cutlinelength,0)
       paper.line(self.cutlinesx[-1]-self.cutlinelength/2,y,self.cutlinelength,0)
-      
+
+  def drawsheet(self,paper,even):
+    """
+    Draw everything which is the same on every side of a paper: the cutlines and the punch holes
+    of all agenda pages. It is drawn once as a template, and reused on every paper.
+
+    @param paper: Object pdfout, representing one side of a paper
+    @type  paper: L(pdfout.pdfout)
+
+    @param even: True for the even side of the paper
+    @type  even: C(bool)
+    """
+    def draw(template):
+      self.drawcutlines(template)
+      if even:
+        origins = self.evenpageorigins
+      else:
+        origins = self.oddpageorigins
+      if self.signature:    # the pages are folded and stitched, not punched
+        return
+      for (x,y) in origins:
+        template.pushorigin(x,y)
+        self.punchholes(template,even)
+        template.poporigin()
+    paper.placetemplate(('sheet',self.paperwidth,self.paperheight,self.agendawidth,self.agendaheight,even),draw)
+
   def formfeed(self):
     """
     Make sure the agenda page is free to be filled, Feed to the next free page. When the physical printer
     paper is full, flush out to file-pdf, and open two empty ones.
     evenpage (page 0) comes before oddpage (page 1), usual people do this the other way round
     """
+    if self.currentpagenr >= 0:
+      self.pagedone(self.pagesheet[self.currentpagenr])
     # make sure there is a empty page
-    if self.currentonevenpage:        # if we are on even page, just change to other side
-      self.currentonevenpage = False
-      self.currentpage = self.oddpage
-      self.oddpage.setorigin(self.oddpageorigins[self.currentagendapage][0],self.oddpageorigins[self.currentagendapage][1])
-    else:     # we need a new page
-      self.currentonevenpage = True
-      self.currentagendapage += 1
-      if self.currentagendapage == self.agendapagesperpage:    # check if paper is full
-        if self.evenpage != None:
-          self.evenpage.save(self.canvas)
-        if self.oddpage != None:
-          self.oddpage.save(self.canvas)
-        self.evenpage = pdfout.pdfout(self.paperwidth,self.paperheight)
-        self.drawcutlines(self.evenpage)
-        self.oddpage = pdfout.pdfout(self.paperwidth,self.paperheight)
-        self.drawcutlines(self.oddpage)
-        self.currentagendapage = 0
-      self.currentpage = self.evenpage   # start on
-      self.evenpage.setorigin(self.evenpageorigins[self.currentagendapage][0],self.evenpageorigins[self.currentagendapage][1])
-    self.punchholes()   # should be different, multiple holes are punched..... on same paper, not good
+    self.currentpagenr += 1
+    if self.currentpagenr >= len(self.pageslot):    # not enough pages in the layout, make it twice as long
+      self.layout(2 * len(self.pageslot) + 2 * self.agendapagesperpage)
+    self.currentonevenpage = self.pageeven[self.currentpagenr] == 1
+    self.currentagendapage = self.pageslot[self.currentpagenr]
+    sheet = self.pagesheet[self.currentpagenr]
+    if sheet not in self.sheets:    # the first agenda page on this paper, we need a new one
+      evenpage = self.document.newpage(self.paperwidth,self.paperheight)
+      self.drawsheet(evenpage,True)
+      oddpage = self.document.newpage(self.paperwidth,self.paperheight)
+      self.drawsheet(oddpage,False)
+      self.sheets[sheet] = [evenpage,oddpage]
+      self.pagesleft[sheet] = 2 * self.agendapagesperpage
+    self.currentpage = self.sheets[sheet][1 - self.pageside[self.currentpagenr]]
+    self.currentpage.setorigin(self.pagex[self.currentpagenr],self.pagey[self.currentpagenr])
+
+  def pagedone(self,sheet):
+    """
+    Count an agenda page of a paper as done, and write out the papers which are full,
+    in the order of the papers
+
+    @param sheet: The number of the paper
+    @type  sheet: C(int)
+    """
+    self.pagesleft[sheet] -= 1
+    while self.pagesleft.get(self.nextsheet) == 0:
+      evenpage,oddpage = self.sheets.pop(self.nextsheet)
+      del self.pagesleft[self.nextsheet]
+      self.savepage(evenpage)
+      self.savepage(oddpage)
+      self.nextsheet += 1
+
+  def layout(self,npages):
+    """
+    Compute where every agenda page goes: on which paper (sheet), on which agenda page of the paper (slot),
+    on which side (even/odd), at which origin, and if it is an even page (holes left).
+    Agenda pages are numbered in the order of formfeed().
+    The layout of one paper is computed once, and repeated for all papers.
+
+    @param npages: The number of agenda pages to compute
+    @type  npages: C(int)
+    """
+    if self.signature:
+      self.layoutsignatures(npages)
+      return
+    slots = []
+    even = []
+    xs = []
+    ys = []
+    for slot in range(self.agendapagesperpage):
+      slots += (slot,slot)
+      even += (1,0)     # first the even side, then the odd side of the same slot
+      xs += (self.evenpageorigins[slot][0],self.oddpageorigins[slot][0])
+      ys += (self.evenpageorigins[slot][1],self.oddpageorigins[slot][1])
+    if not slots:
+      raise ValueError("the agenda page does not fit on the paper")
+    nsheets = -(-npages // len(slots))    # rounded up
+    self.pagesheet = array.array('l')
+    for sheet in range(nsheets):
+      self.pagesheet.extend(array.array('l',(sheet,)) * len(slots))
+    self.pageslot = array.array('l',slots) * nsheets
+    self.pageeven = array.array('b',even) * nsheets
+    self.pageside = self.pageeven     # every agenda page on the even side is an even page
+    self.pagex = array.array('d',xs) * nsheets
+    self.pagey = array.array('d',ys) * nsheets
+
+  def layoutsignatures(self,npages):
+    """
+    Compute the layout of layout() for signatures, as for a booklet: a folio is two agenda pages next to each other,
+    on both sides of the paper, folded once in the middle. The folios of a signature are put in each other,
+    the first one outside. Of a signature of n pages, folio f has pages n-1-2f and 2f on the even side,
+    and 2f+1 and n-2-2f on the odd side. The folios of all signatures fill the papers one after the other,
+    so after cutting, every signature is a stack of folios.
+    The pages are not turned, only folded, so a folio holds just two pages next to each other.
+
+    @param npages: The number of agenda pages to compute
+    @type  npages: C(int)
+    """
+    folios = self.agendapagesperpage // 2     # folios on one paper
+    if folios == 0:
+      raise ValueError("the agenda page does not fit on the paper")
+    pairs = self.xcount // 2     # folios next to each other
+    n = self.signature
+    npages = -(-npages // n) * n     # whole signatures
+    self.pagesheet = array.array('l')
+    self.pageslot = array.array('l')
+    self.pageeven = array.array('b')
+    self.pageside = array.array('b')
+    self.pagex = array.array('d')
+    self.pagey = array.array('d')
+    for page in range(npages):
+      signature,number = divmod(page,n)
+      if number < n // 2:    # 2f on the right of the even side, 2f+1 behind it
+        folio,odd = divmod(number,2)
+        right = 1
+      else:     # n-1-2f on the left of the even side, n-2-2f behind it
+        folio,odd = divmod(n - 1 - number,2)
+        right = 0
+      sheet,position = divmod(signature * (n // 4) + folio,folios)
+      row,pair = divmod(position,pairs)
+      slot = row * self.xcount + 2 * pair + right
+      if odd:
+        x,y = self.oddpageorigins[slot]    # mirrored, so behind the page on the even side
+      else:
+        x,y = self.evenpageorigins[slot]
+      self.pagesheet.append(sheet)
+      self.pageslot.append(slot)
+      self.pageeven.append(1 - number % 2)    # the pages on the right of the fold have the holes left
+      self.pageside.append(1 - odd)
+      self.pagex.append(x)
+      self.pagey.append(y)
+
+  def savepage(self,paper):
+    """
+    Write one side of a paper to the output
+
+    @param paper: Object pdfout, representing one side of a paper
+    @type  paper: L(pdfout.pdfout)
+    """
+    with self.timer.phase('save'):
+      self.document.savepage(paper)
 
   def assertoddpage(self):
     """ make sure we are on an odd page (left side of agenda)
@@ -430,29 +839,114 @@ class filofax:
   def close(self):
     """ write out any object to the pdf-file, and close the pdf stream
     """
-    if self.evenpage != None:
-      self.evenpage.save(self.canvas)
-      self.evenpage = None
-    if self.oddpage != None:
-      self.oddpage.save(self.canvas)
-      self.oddpage = None
-    self.canvas.save()
+    for sheet in sorted(self.sheets):    # the last papers, which are not full
+      evenpage,oddpage = self.sheets.pop(sheet)
+      self.savepage(evenpage)
+      self.savepage(oddpage)
+    self.pagesleft = {}
+    with self.timer.phase('close'):
+      self.document.close()
 
 allowedpapers = {
-  "A4":reportlab.lib.pagesizes.A4,
-  "A3":reportlab.lib.pagesizes.A3,
-  "A2":reportlab.lib.pagesizes.A2,
-  "A1":reportlab.lib.pagesizes.A1,
-  "A0":reportlab.lib.pagesizes.A0,
-  "letter":reportlab.lib.pagesizes.letter,
-  "legal":reportlab.lib.pagesizes.legal,
-  "elevenSeventeen":reportlab.lib.pagesizes.elevenSeventeen,
-  "B5":reportlab.lib.pagesizes.B5,
-  "B4":reportlab.lib.pagesizes.B4,
-  "B3":reportlab.lib.pagesizes.B3,
-  "B2":reportlab.lib.pagesizes.B2,
-  "B1":reportlab.lib.pagesizes.B1,
-  "B0":reportlab.lib.pagesizes.B0}
+  "A4":(210*mm,297*mm),     # as in reportlab.lib.pagesizes
+  "A3":(297*mm,420*mm),
+  "A2":(420*mm,594*mm),
+  "A1":(594*mm,841*mm),
+  "A0":(841*mm,1189*mm),
+  "letter":(8.5*inch,11*inch),
+  "legal":(8.5*inch,14*inch),
+  "elevenSeventeen":(11*inch,17*inch),
+  "B5":(176*mm,250*mm),
+  "B4":(250*mm,353*mm),
+  "B3":(353*mm,500*mm),
+  "B2":(500*mm,707*mm),
+  "B1":(707*mm,1000*mm),
+  "B0":(1000*mm,1414*mm)}
+
+def orientation(paper,orient):
+  """
+  Return the size of the paper in an orientation, like reportlab.lib.pagesizes.portrait() and landscape()
+
+  @param paper: The size of the paper (width,height) in 1/72", in any orientation
+  @type  paper: C((float, float))
+
+  @param orient: 'Portrait' or 'Landscape'
+  @type  orient: C(str)
+
+  @rtype: C((float, float))
+  """
+  if orient == 'Portrait':
+    return (min(paper),max(paper))
+  return (max(paper),min(paper))
+
+def fitagendapages(paper,filofax,margin=0,signature=0):
+  """
+  Return how many agenda pages fit on the paper next to each other, and below each other
+
+  @param paper: The size of the paper (width,height) in 1/72", in the orientation used
+  @type  paper: C((float, float))
+
+  @param filofax: Size of the agenda, see agendasizes
+  @type  filofax: C(tuple)
+
+  @param margin: The minimal space between the agenda pages and the edge of the paper in mm
+  @type  margin: C(float)
+
+  @param signature: Pages per signature, not 0 for an even number of agenda pages next to each other
+  @type  signature: C(int)
+
+  @rtype: C((int, int))
+  """
+  width = paper[0] * 10 / cm - 2 * margin
+  height = paper[1] * 10 / cm - 2 * margin
+  xcount = max(0,int(width / filofax[0]))
+  if signature:    # folios of two pages
+    xcount -= xcount % 2
+  return xcount,max(0,int(height / filofax[1]))
+
+def checkfit(paper,filofax,margin=0,signature=0):
+  """
+  Return how many agenda pages fit on the paper next to each other, and below each other, see fitagendapages()
+
+  @raise ValueError: The margin is negative, or no agenda page fits on the paper
+  @rtype: C((int, int))
+  """
+  if margin < 0:
+    raise ValueError("the margin can not be negative")
+  xcount,ycount = fitagendapages(paper,filofax,margin,signature)
+  if xcount * ycount == 0:
+    if signature and fitagendapages(paper,filofax,margin)[0] * ycount > 0:
+      raise ValueError("for signatures two agenda pages must fit next to each other on the paper")
+    raise ValueError("the agenda page does not fit on the paper with a margin of {margin:g} mm".format(margin = margin))
+  return xcount,ycount
+
+def bestorientation(paper,filofax,margin=0,signature=0):
+  """
+  Return the orientation of the paper with the most agenda pages on it, Portrait when both have as many.
+  The agenda pages are not turned, the drawing outputs can only move the origin.
+
+  @param paper: The size of the paper (width,height) in 1/72", in any orientation
+  @type  paper: C((float, float))
+
+  @param filofax: Size of the agenda, see agendasizes
+  @type  filofax: C(tuple)
+
+  @param margin: The minimal space between the agenda pages and the edge of the paper in mm
+  @type  margin: C(float)
+
+  @param signature: Pages per signature, 0 for none
+  @type  signature: C(int)
+
+  @return: 'Portrait' or 'Landscape'
+  @rtype:  C(str)
+  """
+  best = None
+  for orient in ('Portrait','Landscape'):
+    xcount,ycount = fitagendapages(orientation(paper,orient),filofax,margin,signature)
+    if best == None or xcount * ycount > bestcount:
+      best = orient
+      bestcount = xcount * ycount
+  return best
 
 # width,height,nrholes,offset,distancebetweenholes
 agendasizes = {
@@ -478,51 +972,537 @@ fonts = (
     "Times-Italic",
     "Times-Roman",
     "ZapfDingbats" )
-parser = argparse.ArgumentParser(description='Create a FilofaxDIY printable agenda')
-parser.add_argument('--landscape',dest='orient',action='store_const',const='Landscape')
-parser.add_argument('--portrait',dest='orient',action='store_const',const='Portrait')
-parser.add_argument('--paper',default='letter',choices=allowedpapers)
-parser.add_argument('--font',default='Helvetica',choices=fonts)
-#parser.add_argument('--filofax',default='Personal',choices=agendasizes)
-parser.add_argument('--filofax',default='Personal',choices=('Personal'))
-parser.add_argument('--format',default='weekon2pages',choices=('weekon2pages','weekon6pages'))
-parser.add_argument('--lineheight',default=4,type=int,choices=range(11))
-parser.add_argument('--year',type=int,default=datetime.date.today().year + 1,choices=range(2014,2025))
-#parser.add_argument('--language',choices=('en_US.UTF8','nl_NL.UTF8','fy_NL.UTF8'))
-parser.add_argument('--language',type=str)
-
-args = parser.parse_args()
-if args.orient == None:
-  args.orient = 'Portrait'
-#print(args)
-
-#-language nl_NL
-#of en_US of fy_NL
-"""
--Landscape
--Portrait
--paper A4
--font Timesnewroman
-&-format weekon2pages | weekon6pages
--lineheight 4
--filofax personal
-&-year 2015
-"""
+def makeagenda(year,language,font,lineheight,paper,orient,filofaxsize,format,filename=None,timer=None,xfigfiles=False,svgfiles=False,
+               reproducible=False,cachedir=None,cachesize=500,incremental=False,icsfiles=None,output=None,jobs=1,precision=0.01,
+               margin=0,signature=0):
+  """
+  Create one agenda pdf-file, by default named after its parameters, or write it to a stream
+
+  @param year: The year for which the agenda is created
+  @type  year: C(int)
+
+  @param paper: The key of the paper in allowedpapers
+  @type  paper: C(str)
+
+  @param filofaxsize: The key of the agenda size in agendasizes
+  @type  filofaxsize: C(str)
 
+  @param format: 'weekon2pages' or 'weekon6pages'
+  @type  format: C(str)
 
-#nextyear = datetime.date.today().year + 1
-nextnewyearsday = datetime.date(args.year,1,1)
-lastmondayofyear = nextnewyearsday - nextnewyearsday.weekday() * datetime.date.resolution
+  @param filename: The name of the file to create, None for the default name
+  @type  filename: C(str)
 
-day = lastmondayofyear
-outputfilename = "{size}_{year}_{locale}_{format}.pdf".format(size = args.filofax,year = args.year,locale = args.language,format = args.format)
-#print(outputfilename)
-agenda = filofax(args.language,args.font,args.lineheight,allowedpapers[args.paper],args.orient,outputfilename,agendasizes[args.filofax])
-agenda.titlepage(str(args.year))
-while day.year <= args.year:
-  if args.format == 'weekon2pages':
-    agenda.weekon2pages(day)
+  @param timer: Measures the time of the phases, None for not reporting it
+  @type  timer: C(phasetimer)
+
+  @param xfigfiles: Also write every side of the paper as a fig-file, named after the pdf-file
+  @type  xfigfiles: C(bool)
+
+  @param svgfiles: Also write every side of the paper as a svg-file, named after the pdf-file
+  @type  svgfiles: C(bool)
+
+  @param reproducible: Make the same pdf-file for the same parameters (fixed creation date and ID)
+  @type  reproducible: C(bool)
+
+  @param cachedir: Directory with earlier made pdf-files, None for no cache. Implies reproducible.
+                   The cache is not used for xfig and svg files.
+  @type  cachedir: C(str)
+
+  @param cachesize: The maximum size of the cache in MB
+  @type  cachesize: C(int)
+
+  @param incremental: Keep the pages in filename.pages, and only draw the pages which are different
+                      from the previous run
+  @type  incremental: C(bool)
+
+  @param icsfiles: iCalendar files with the events to write on the days, None for no events
+  @type  icsfiles: C([str])
+
+  @param output: Binary stream to write the pdf to instead of a file, eg io.BytesIO or sys.stdout.buffer.
+                 filename (or the default name) is still the base of the xfig, svg and .pages files.
+  @type  output: C(file)
+
+  @param jobs: Number of processes which draw the sheets of the agenda, see drawsheets()
+  @type  jobs: C(int)
+
+  @param precision: The coordinates in the pdf are rounded to a multiple of this in 1/72", None for no rounding
+  @type  precision: C(float)
+
+  @param margin: The minimal space between the agenda pages and the edge of the paper in mm
+  @type  margin: C(float)
+
+  @param signature: Number of agenda pages per signature (a multiple of 4), 0 to cut the papers in single pages
+  @type  signature: C(int)
+
+  @return: The name of the created file, or output
+  @rtype:  C(str)
+  """
+  if jobs > 1 and (xfigfiles or svgfiles or incremental):
+    raise ValueError("more jobs only work for pdf-files, without incremental")
+  if signature % 4 != 0 or signature < 0:
+    raise ValueError("a signature must be a multiple of 4 pages")
+  if margin < 0:
+    raise ValueError("the margin can not be negative")
+  if orient == 'Auto':
+    orient = bestorientation(allowedpapers[paper],agendasizes[filofaxsize],margin,signature)
+  outputfilename = filename
+  if outputfilename == None:
+    outputfilename = "{size}_{year}_{locale}_{format}.pdf".format(size = filofaxsize,year = year,locale = language,format = format)
+  #print(outputfilename)
+  cache = None
+  if cachedir != None and not (xfigfiles or svgfiles):
+    cache = outputcache.outputcache(cachedir,cachesize * 1024 * 1024)
+    key = cache.key(FILOFAXDIYVERSION,sourcefingerprint(),year,language,font,lineheight,paper,allowedpapers[paper],orient,
+                    filofaxsize,agendasizes[filofaxsize],format,filesfingerprint(icsfiles or []),precision,margin,signature)
+    if output != None:
+      if cache.copy(key,output):
+        return output
+    elif cache.fetch(key,outputfilename):
+      return outputfilename
+    reproducible = True
+  target = outputfilename
+  if output != None:
+    target = output
+    if cache != None:     # the cache needs the contents as well
+      target = io.BytesIO()
+  elif os.path.exists(outputfilename) and os.stat(outputfilename).st_nlink > 1:
+    os.remove(outputfilename)     # a hard link to a file in a cache, do not overwrite that one
+  if timer == None:
+    timer = phasetimer()
+  with timer.phase('init'):
+    pagesize = orientation(allowedpapers[paper],orient)
+    pages = None
+    if incremental:
+      pages = pdfout.pagestore(outputfilename + '.pages')
+    fonts = ()
+    if jobs > 1:    # the pages are made by other processes, the font must have the same name there
+      fonts = (font,)
+    pdf = pdfout.pdfdocument(target,pagesize,reproducible,pages,fonts,precision)
+    document = pdf
+    if xfigfiles or svgfiles:
+      documents = [document]
+      basename = os.path.splitext(outputfilename)[0]
+      if xfigfiles:
+        from xfiglib import xfig
+        documents.append(xfig.xfigdocument(basename,paper,orient))
+      if svgfiles:
+        from xfiglib import svgout
+        documents.append(svgout.svgdocument(basename))
+      document = backend.multidocument(documents)
+  if jobs > 1:
+    drawsheets(document,(year,language,font,lineheight,paper,orient,filofaxsize,format,icsfiles,precision,margin,signature),jobs,timer)
   else:
-    agenda.weekon6pages(day)
-  day += datetime.date.resolution * 7
-agenda.close()
+    with timer.phase('init'):
+      agenda = filofax(language,font,lineheight,allowedpapers[paper],orient,outputfilename,agendasizes[filofaxsize],document,margin,
+                       signature)
+    agenda.timer = timer
+    drawagenda(agenda,year,format,icsfiles,timer)
+  # per page, also of the pages drawn by other processes
+  for name,values in (('state emitted',pdf.emitted),('state skipped',pdf.skipped),('lines merged',pdf.merged),
+                      ('compacted bytes',pdf.compacted)):
+    for value in values:
+      timer.amount(name,value)
+  if output != None:
+    if cache != None:
+      cache.storedata(key,target.getvalue())
+      output.write(target.getvalue())
+    return output
+  if cache != None:
+    cache.store(key,outputfilename)
+  return outputfilename
+
+def drawagenda(agenda,year,format,icsfiles,timer):
+  """
+  Draw the title page and the weeks of a year in an agenda, and close it
+
+  @param agenda: The agenda, after the year
+  @type  agenda: C(filofax)
+
+  @param format: 'weekon2pages' or 'weekon6pages'
+  @type  format: C(str)
+
+  @param icsfiles: iCalendar files with the events to write on the days, None for no events
+  @type  icsfiles: C([str])
+
+  @param timer: Measures the time of the phases
+  @type  timer: C(phasetimer)
+  """
+  nextnewyearsday = datetime.date(year,1,1)
+  lastmondayofyear = nextnewyearsday - nextnewyearsday.weekday() * datetime.date.resolution
+  day = lastmondayofyear
+  with timer.phase('layout'):
+    agenda.setyear(year)
+    # the title page, and the pages for every week
+    weeks = (datetime.date(year,12,31) - lastmondayofyear).days // 7 + 1
+    if format == 'weekon2pages':
+      agenda.layout(1 + weeks * 2)
+    else:
+      agenda.layout(1 + weeks * 6)
+  if icsfiles:
+    with timer.phase('events'):
+      agenda.setevents(icsfiles)
+  with timer.phase('titlepage'):
+    agenda.titlepage(str(year))
+  while day.year <= year:
+    with timer.phase(format):
+      if format == 'weekon2pages':
+        agenda.weekon2pages(day)
+      else:
+        agenda.weekon6pages(day)
+    day += datetime.date.resolution * 7
+  agenda.close()
+
+def rendersheets(job):
+  """
+  Draw a part of the sheets of an agenda in a worker process, see drawsheets()
+
+  @param job: The parameters of the agenda (year up to format, icsfiles, precision, margin and signature), the number of parts
+              and the part to draw
+  @type  job: C((tuple, int, int))
+
+  @return: The pages and the templates, see pdfout.pdfsheets
+  @rtype:  C(([tuple], dict))
+  """
+  args,parts,part = job
+  year,language,font,lineheight,paper,orient,filofaxsize,format,icsfiles,precision,margin,signature = args
+  document = pdfout.pdfsheets(orientation(allowedpapers[paper],orient),parts,part,(font,),precision)
+  agenda = filofax(language,font,lineheight,allowedpapers[paper],orient,None,agendasizes[filofaxsize],document,margin,signature)
+  drawagenda(agenda,year,format,icsfiles,phasetimer())
+  return document.pages,document.drawings
+
+def drawsheets(document,args,parts,timer):
+  """
+  Draw an agenda with more processes: every process draws the pages of its share of the sheets
+  (and skips the drawing of the others), and the pages are put in the pdf in the right order here.
+  Fonts and templates are shared by all pages of the pdf.
+
+  @param document: The pdf, with the font of the agenda named first
+  @type  document: C(pdfout.pdfdocument)
+
+  @param args: The parameters of the agenda, year up to format, icsfiles, precision, margin and signature
+  @type  args: C(tuple)
+
+  @param parts: The number of processes
+  @type  parts: C(int)
+
+  @param timer: Measures the time of the phases
+  @type  timer: C(phasetimer)
+  """
+  import concurrent.futures
+  with timer.phase('sheets'):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=parts,initializer=warmup,initargs=(args[2],)) as pool:
+      results = list(pool.map(rendersheets,[(args,parts,part) for part in range(parts)]))
+  with timer.phase('assemble'):
+    document.setinfo(*documentinfo)
+    pages = []
+    for sheetpages,templates in results:
+      document.addtemplates(templates)
+      pages.extend(sheetpages)
+    pages.sort(key=lambda page: page[0])
+    for number,record,drawings,counts in pages:
+      document.addpage(record,drawings,counts)
+  with timer.phase('close'):
+    document.close()
+
+fingerprint = None     # hash of the source, see sourcefingerprint()
+
+agendaplan = collections.namedtuple('agendaplan','orient sheets slotspersheet slots used size milliseconds')
+
+def planagenda(year,language,font,lineheight,paper,orient,filofaxsize,format,icsfiles=None,margin=0,signature=0):
+  """
+  Run only the layout and pagination of an agenda, on a nullout.nulldocument: nothing is rendered or written.
+  For comparing papers and formats before printing.
+
+  @param paper: The key of the paper in allowedpapers
+  @type  paper: C(str)
+
+  @param filofaxsize: The key of the agenda size in agendasizes
+  @type  filofaxsize: C(str)
+
+  @param format: 'weekon2pages' or 'weekon6pages'
+  @type  format: C(str)
+
+  @param icsfiles: iCalendar files with the events to write on the days, None for no events
+  @type  icsfiles: C([str])
+
+  @param margin: The minimal space between the agenda pages and the edge of the paper in mm
+  @type  margin: C(float)
+
+  @param signature: Number of agenda pages per signature, 0 for none
+  @type  signature: C(int)
+
+  @return: The orientation ('Auto' is chosen here), the number of sheets (both sides of a paper), agenda pages per side, agenda pages on all sheets,
+           agenda pages with a drawing, the estimated size of the pdf-file in bytes, and the time of the plan
+  @rtype:  C(agendaplan)
+  """
+  start = time.perf_counter()
+  if orient == 'Auto':
+    orient = bestorientation(allowedpapers[paper],agendasizes[filofaxsize],margin,signature)
+  document = nullout.nulldocument()
+  agenda = filofax(language,font,lineheight,allowedpapers[paper],orient,None,agendasizes[filofaxsize],document,margin,signature)
+  drawagenda(agenda,year,format,icsfiles,phasetimer())
+  sheets = len(document.pages) // 2
+  return agendaplan(orient,sheets,agenda.agendapagesperpage,sheets * 2 * agenda.agendapagesperpage,
+                    sum(page.used for page in document.pages),document.pdfsize(),(time.perf_counter() - start) * 1000)
+
+def printplans(jobs,out=sys.stdout):
+  """
+  Print the plan of every agenda, one line each
+
+  @param jobs: The parameters of makeagenda, and the keyword parameters (icsfiles, margin and signature are used), per agenda
+  @type  jobs: C([(tuple, dict)])
+  """
+  print("{0:4} {1:15} {2:9} {3:12} {4:8} {5:>6} {6:>8} {7:>5} {8:>5} {9:>6} {10:>7} {11:>6}".format(
+        'year','paper','orient','format','agenda','sheets','per side','used','blank','usage','size kB','ms'),file=out)
+  for args,options in jobs:
+    year,language,font,lineheight,paper,orient,filofaxsize,format = args
+    try:
+      plan = planagenda(*args,icsfiles=options.get('icsfiles'),margin=options.get('margin',0),signature=options.get('signature',0))
+    except ValueError as error:    # does not fit, the other agendas are planned
+      print("{0:<4} {1:15} {2:9} {3:12} {4:8} {5}".format(year,paper,orient,format,filofaxsize,error),file=out)
+      continue
+    print("{0:<4} {1:15} {2:9} {3:12} {4:8} {5:6} {6:8} {7:5} {8:5} {9:5.1f}% {10:7.0f} {11:6.1f}".format(
+          year,paper,plan.orient,format,filofaxsize,plan.sheets,plan.slotspersheet,plan.used,
+          plan.slots - plan.used,100.0 * plan.used / plan.slots,plan.size / 1024.0,plan.milliseconds),file=out)
+
+def sourcefingerprint():
+  """
+  Return a hash of everything that determines the layout of the agendas: the source of
+  this program and the drawing libraries, and the title page image
+
+  @rtype: C(str)
+  """
+  global fingerprint
+  if fingerprint == None:
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in [__file__,'gplv3.jpg','icscalendar.py','specialdays.py'] + sorted(glob.glob(os.path.join(directory,'xfiglib','*.py'))):
+      with open(os.path.join(directory,name),'rb') as f:
+        digest.update(f.read())
+    fingerprint = digest.hexdigest()
+  return fingerprint
+
+def filesfingerprint(filenames):
+  """
+  Return a hash of the contents of files, eg the ics-files of an agenda
+
+  @param filenames: The files
+  @type  filenames: C([str])
+
+  @rtype: C(str)
+  """
+  digest = hashlib.sha256()
+  for filename in filenames:
+    with open(filename,'rb') as f:
+      digest.update(hashlib.sha256(f.read()).digest())
+  return digest.hexdigest()
+
+def warmup(font):
+  """
+  Initializer of a batch worker process, load everything that is shared between the jobs once
+  (font metrics and the title page image), so every job only pays for its own drawing.
+
+  @param font: The font which will be used by the jobs
+  @type  font: C(str)
+  """
+  import reportlab.pdfbase.pdfmetrics
+  import reportlab.lib.utils
+  reportlab.pdfbase.pdfmetrics.getFont(font)
+  reportlab.lib.utils.ImageReader('gplv3.jpg')
+
+def batchjob(job):
+  """
+  Create one agenda of a batch, and measure how long it took
+
+  @param job: The parameters and keyword parameters for makeagenda()
+  @type  job: C((tuple, dict))
+
+  @return: The name of the created file and the wall time in seconds
+  @rtype:  C((str, float))
+  """
+  start = time.perf_counter()
+  filename = makeagenda(*job[0],**job[1])
+  return filename,time.perf_counter() - start
+
+def makebatch(jobs,font,workers=None):
+  """
+  Create many agendas at once, spread over a pool of processes. Every process creates
+  complete agendas, because the locale is global per process.
+
+  @param jobs: The parameters and keyword parameters for makeagenda(), one tuple per agenda
+  @type  jobs: C([(tuple, dict)])
+
+  @param font: The font used by all jobs, to warm up the workers
+  @type  font: C(str)
+
+  @param workers: Number of processes, None is one per core
+  @type  workers: C(int)
+
+  @return: The total wall time in seconds
+  @rtype:  C(float)
+  """
+  import concurrent.futures
+  start = time.perf_counter()
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers,initializer=warmup,initargs=(font,)) as pool:
+    for filename,seconds in pool.map(batchjob,jobs):
+      print("{filename}: {seconds:.2f}s".format(filename = filename,seconds = seconds))
+  total = time.perf_counter() - start
+  print("{count} agendas in {seconds:.2f}s".format(count = len(jobs),seconds = total))
+  return total
+
+def generate(year,paper='A4',format='weekon2pages',filofaxsize='Personal',language=None,font='Helvetica',lineheight=4,
+             orient='Portrait',filename=None,**options):
+  """
+  Create one agenda pdf-file, for use from other programs. The parameters are checked first,
+  so a wrong parameter raises ValueError before anything is drawn.
+
+  @param year: The year for which the agenda is created
+  @type  year: C(int)
+
+  @param paper: The key of the paper in allowedpapers
+  @type  paper: C(str)
+
+  @param format: 'weekon2pages' or 'weekon6pages'
+  @type  format: C(str)
+
+  @param filofaxsize: The key of the agenda size in agendasizes
+  @type  filofaxsize: C(str)
+
+  @param options: The other keyword parameters of makeagenda(), eg cachedir or icsfiles
+  @type  options: C(dict)
+
+  @return: The name of the created file
+  @rtype:  C(str)
+  """
+  if paper not in allowedpapers:
+    raise ValueError("unknown paper {0!r}, choose from {1}".format(paper,', '.join(sorted(allowedpapers))))
+  if filofaxsize not in agendasizes:
+    raise ValueError("unknown agenda size {0!r}, choose from {1}".format(filofaxsize,', '.join(sorted(agendasizes))))
+  if format not in ('weekon2pages','weekon6pages'):
+    raise ValueError("unknown format {0!r}, choose from weekon2pages, weekon6pages".format(format))
+  if font not in fonts:
+    raise ValueError("unknown font {0!r}, choose from {1}".format(font,', '.join(fonts)))
+  if orient not in ('Portrait','Landscape','Auto'):
+    raise ValueError("unknown orientation {0!r}, choose from Portrait, Landscape, Auto".format(orient))
+  if not 0 <= lineheight <= 10:
+    raise ValueError("lineheight must be between 0 and 10")
+  margin = options.get('margin',0)
+  signature = options.get('signature',0)
+  if orient == 'Auto':
+    orient = bestorientation(allowedpapers[paper],agendasizes[filofaxsize],margin,signature)
+  checkfit(orientation(allowedpapers[paper],orient),agendasizes[filofaxsize],margin,signature)
+  return makeagenda(year,language,font,lineheight,paper,orient,filofaxsize,format,filename,**options)
+
+def main(argv=None):
+  """
+  Create the agendas of the command line
+
+  @param argv: The arguments, None for sys.argv[1:]
+  @type  argv: C([str])
+  """
+  parser = argparse.ArgumentParser(description='Create a FilofaxDIY printable agenda')
+  parser.add_argument('--landscape',dest='orient',action='store_const',const='Landscape')
+  parser.add_argument('--portrait',dest='orient',action='store_const',const='Portrait')
+  parser.add_argument('--fit',dest='orient',action='store_const',const='Auto',
+                      help='choose the orientation of the paper with the most agenda pages on it')
+  parser.add_argument('--signature',metavar='PAGES',type=int,default=0,
+                      help='fold the papers into signatures of PAGES agenda pages (a multiple of 4), like a booklet')
+  parser.add_argument('--margin',metavar='MM',type=float,default=0,help='minimal space at the edges of the paper, eg for the printer (default 0)')
+  parser.add_argument('--paper',nargs='+',default=['letter'],choices=allowedpapers)
+  parser.add_argument('--font',default='Helvetica',choices=fonts)
+  #parser.add_argument('--filofax',default='Personal',choices=agendasizes)
+  parser.add_argument('--filofax',nargs='+',default=['Personal'],choices=('Personal'))
+  parser.add_argument('--format',nargs='+',default=['weekon2pages'],choices=('weekon2pages','weekon6pages'))
+  parser.add_argument('--lineheight',default=4,type=int,choices=range(11))
+  parser.add_argument('--year',nargs='+',type=int,default=[datetime.date.today().year + 1],choices=range(2014,2025))
+  #parser.add_argument('--language',choices=('en_US.UTF8','nl_NL.UTF8','fy_NL.UTF8'))
+  parser.add_argument('--language',nargs='+',type=str,default=[None])
+  parser.add_argument('--plan',action='store_true',help='print the sheets, used agenda pages and estimated size, without making the agendas')
+  parser.add_argument('--jobs',type=int,default=1,help='number of processes which draw the sheets of one agenda')
+  parser.add_argument('--workers',type=int,help='number of processes when more than one agenda is created (default one per core)')
+  parser.add_argument('--xfig',action='store_true',help='also write every side of the paper as a fig-file')
+  parser.add_argument('--svg',action='store_true',help='also write every side of the paper as a svg-file')
+  parser.add_argument('--precision',metavar='PT',type=float,default=0.01,
+                      help='round the coordinates in the pdf to a multiple of PT points, 0 for no rounding (default 0.01)')
+  parser.add_argument('--reproducible',action='store_true',help='make the same pdf-file for the same parameters (fixed creation date and ID)')
+  parser.add_argument('--cache',metavar='DIR',help='reuse the pdf-files made earlier with the same parameters, kept in DIR')
+  parser.add_argument('--cachesize',metavar='MB',default=500,type=int,help='maximum size of the cache (default 500 MB)')
+  parser.add_argument('--incremental',action='store_true',help='only draw the pages which changed since the previous run (kept in a .pages file)')
+  parser.add_argument('--output',metavar='FILE',help='name of the pdf-file, - writes it to stdout (one agenda only)')
+  parser.add_argument('--ics',nargs='+',metavar='FILE',help='write the events of these iCalendar files on the days')
+  parser.add_argument('--profile',action='store_true',help='print the time spent per phase, and the bytes saved per page by the compaction of the pdf')
+  parser.add_argument('--profiledump',metavar='FILE',help='write cProfile statistics to FILE (for pstats), implies --profile')
+
+  args = parser.parse_args(argv)
+  if args.orient == None:
+    args.orient = 'Portrait'
+  #print(args)
+
+  #-language nl_NL
+  #of en_US of fy_NL
+  """
+  -Landscape
+  -Portrait
+  -paper A4
+  -font Timesnewroman
+  &-format weekon2pages | weekon6pages
+  -lineheight 4
+  -filofax personal
+  &-year 2015
+  """
+
+  # every combination of the parameters which are given more than once is one agenda
+  options = {'xfigfiles':args.xfig,'svgfiles':args.svg,'reproducible':args.reproducible,'cachedir':args.cache,'cachesize':args.cachesize,
+             'incremental':args.incremental,'icsfiles':args.ics,'jobs':args.jobs,
+             'precision':args.precision or None,'margin':args.margin,'signature':args.signature}
+  jobs = [((year,language,args.font,args.lineheight,paper,args.orient,filofaxsize,format),options)
+          for year,language,format,paper,filofaxsize in itertools.product(args.year,args.language,args.format,args.paper,args.filofax)]
+  if args.profiledump != None:
+    args.profile = True
+  if args.profile and len(jobs) != 1:
+    parser.error("--profile works with one agenda only")
+  if args.signature % 4 != 0 or args.signature < 0:
+    parser.error("--signature must be a multiple of 4")
+  if args.margin < 0:
+    parser.error("--margin can not be negative")
+  if not args.plan:     # the plan shows which ones do not fit
+    for paper,filofaxsize in itertools.product(args.paper,args.filofax):
+      orient = args.orient
+      if orient == 'Auto':
+        orient = bestorientation(allowedpapers[paper],agendasizes[filofaxsize],args.margin,args.signature)
+      try:
+        checkfit(orientation(allowedpapers[paper],orient),agendasizes[filofaxsize],args.margin,args.signature)
+      except ValueError as error:
+        parser.error("{filofax} on {paper}: {error}".format(filofax = filofaxsize,paper = paper,error = error))
+  if args.jobs > 1 and len(jobs) != 1:
+    parser.error("--jobs works with one agenda only, use --workers for more agendas")
+  if args.jobs > 1 and (args.xfig or args.svg or args.incremental):
+    parser.error("--jobs does not work with --xfig, --svg and --incremental")
+  if args.output != None:
+    if len(jobs) != 1:
+      parser.error("--output works with one agenda only")
+    if args.output == '-':
+      options['output'] = sys.stdout.buffer
+    else:
+      options['filename'] = args.output
+  if args.plan:
+    printplans(jobs)
+  elif args.profile:
+    timer = phasetimer()
+    profiler = None
+    if args.profiledump != None:
+      profiler = cProfile.Profile()
+      profiler.enable()
+    makeagenda(*jobs[0][0],timer=timer,**jobs[0][1])
+    if profiler != None:
+      profiler.disable()
+      profiler.dump_stats(args.profiledump)
+    timer.report()
+  elif len(jobs) == 1:
+    batchjob(jobs[0])
+  else:
+    makebatch(jobs,args.font,args.workers)
+
+if __name__ == '__main__':
+  main()
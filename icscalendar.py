@@ -0,0 +1,495 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Read the events of iCalendar (.ics) files, to print them in the agenda.
+Only what is needed for printing is read: DTSTART, DTEND/DURATION, SUMMARY, RRULE and EXDATE
+of VEVENTs. Times are printed as they are in the file, time zones are not converted.
+RRULE supports FREQ (DAILY up to YEARLY), INTERVAL, COUNT, UNTIL, BYDAY (also with a number, eg 4TH or -1SU),
+BYMONTHDAY, BYMONTH and BYSETPOS. For other rules only the first occurrence is printed, with a warning.
+"""
+import re
+import sys
+import datetime
+
+class event:
+  """
+  One (occurrence of an) event
+
+  @ivar start: The start of the event
+  @type start: C(datetime.datetime)
+
+  @ivar end: The end of the event (not included)
+  @type end: C(datetime.datetime)
+
+  @ivar summary: The text of the event
+  @type summary: C(str)
+
+  @ivar allday: True when the event has dates without times
+  @type allday: C(bool)
+  """
+  def __init__(self,start,end,summary,allday):
+    self.start = start
+    self.end = end
+    self.summary = summary
+    self.allday = allday
+
+  def label(self,day):
+    """
+    Return the text to print for the event on a day
+
+    @param day: The day on which the event is printed
+    @type  day: C(datetime.date)
+
+    @rtype: C(str)
+    """
+    if self.allday or self.start.date() != day:
+      return self.summary
+    return "{time} {summary}".format(time = self.start.strftime("%H:%M"),summary = self.summary)
+
+def ordinal(moment):
+  """
+  Return a moment as a number, days since 1-1-1
+
+  @param moment: The moment
+  @type  moment: C(datetime.datetime)
+
+  @rtype: C(float)
+  """
+  return moment.toordinal() + (moment.hour * 3600 + moment.minute * 60 + moment.second) / 86400.0
+
+class intervalindex:
+  """
+  A centered interval tree, to find all intervals which overlap a range in O(log n + k).
+  An interval [start, end) includes start and not end.
+
+  Every node has a center, the intervals which contain the center (sorted by start,
+  and sorted by end descending) and the nodes with the intervals left and right of the center.
+  """
+  def __init__(self,intervals):
+    """
+    @param intervals: The intervals (start, end, item), start < end
+    @type  intervals: C([(float, float, object)])
+    """
+    self.root = self.build(sorted(intervals,key=lambda interval: interval[0]))
+
+  def build(self,intervals):
+    """
+    Return the node for the intervals, sorted by start
+
+    @rtype: C((float, [tuple], [tuple], tuple, tuple))
+    """
+    if not intervals:
+      return None
+    center = intervals[len(intervals) // 2][0]     # the median start, at least that interval is in the node
+    left = []
+    right = []
+    here = []
+    for interval in intervals:
+      if interval[1] <= center:
+        left.append(interval)
+      elif interval[0] > center:
+        right.append(interval)
+      else:
+        here.append(interval)
+    byend = sorted(here,key=lambda interval: -interval[1])
+    return (center,here,byend,self.build(left),self.build(right))
+
+  def find(self,low,high):
+    """
+    Return the items of all intervals which overlap [low, high)
+
+    @param low: The start of the range
+    @type  low: C(float)
+
+    @param high: The end of the range (not included)
+    @type  high: C(float)
+
+    @rtype: C([object])
+    """
+    result = []
+    nodes = [self.root]
+    while nodes:
+      node = nodes.pop()
+      if node is None:
+        continue
+      center,bystart,byend,left,right = node
+      if high <= center:     # all intervals of the node end after the range, check the start
+        for start,end,item in bystart:
+          if start >= high:
+            break
+          result.append(item)
+        nodes.append(left)
+      elif low > center:     # all intervals of the node start before the range, check the end
+        for start,end,item in byend:
+          if end <= low:
+            break
+          result.append(item)
+        nodes.append(right)
+      else:    # the center is in the range
+        result.extend(item for start,end,item in bystart)
+        nodes.append(left)
+        nodes.append(right)
+    return result
+
+class calendar:
+  """
+  The events of one or more ics-files, between two dates, indexed per day
+
+  @ivar events: All events, recurring events are expanded
+  @type events: C([event])
+  """
+  def __init__(self,filenames,first,last):
+    """
+    @param filenames: The ics-files to read
+    @type  filenames: C([str])
+
+    @param first: The first day to read events for
+    @type  first: C(datetime.date)
+
+    @param last: The last day to read events for
+    @type  last: C(datetime.date)
+    """
+    self.first = datetime.datetime.combine(first,datetime.time())
+    self.last = datetime.datetime.combine(last + datetime.date.resolution,datetime.time())    # not included
+    self.events = []
+    for filename in filenames:
+      with open(filename,encoding='utf-8',errors='replace') as f:
+        self.read(f)
+    self.index = intervalindex([(ordinal(e.start),ordinal(e.end),e) for e in self.events])
+
+  def day(self,day):
+    """
+    Return the texts of the events on a day, sorted by start
+
+    @param day: The day
+    @type  day: C(datetime.date)
+
+    @rtype: C([str])
+    """
+    start = day.toordinal()
+    found = self.index.find(start,start + 1)
+    found.sort(key=lambda e: (not e.allday,e.start,e.summary))
+    return [e.label(day) for e in found]
+
+  def read(self,f):
+    """
+    Read the events of an ics-file
+
+    @param f: The open file
+    @type  f: C(file)
+    """
+    properties = None
+    for name,parameters,value in contentlines(f):
+      if name == 'BEGIN' and value == 'VEVENT':
+        properties = {}
+      elif name == 'END' and value == 'VEVENT':
+        if properties != None and 'DTSTART' in properties:
+          self.addevent(properties)
+        properties = None
+      elif properties != None:
+        if name == 'EXDATE':
+          properties.setdefault(name,[]).extend((parameters,v) for v in value.split(','))
+        else:
+          properties[name] = (parameters,value)
+
+  def addevent(self,properties):
+    """
+    Add an event, and all its occurrences between first and last
+
+    @param properties: The properties of the VEVENT, name -> (parameters, value)
+    @type  properties: C(dict)
+    """
+    start,allday = parsedatetime(*properties['DTSTART'])
+    if 'DTEND' in properties:
+      end = parsedatetime(*properties['DTEND'])[0]
+    elif 'DURATION' in properties:
+      end = start + parseduration(properties['DURATION'][1])
+    elif allday:
+      end = start + datetime.timedelta(days=1)
+    else:
+      end = start
+    duration = max(end - start,datetime.timedelta(minutes=1))    # an interval may not be empty
+    summary = unescape(properties.get('SUMMARY',({},''))[1])
+    excluded = set(parsedatetime(*exdate)[0] for exdate in properties.get('EXDATE',[]))
+    starts = [start]
+    if 'RRULE' in properties:
+      try:
+        starts = recurrences(start,properties['RRULE'][1],self.last,self.first - duration)
+      except ValueError as error:    # only the first occurrence, not on wrong days
+        print("{summary}: {error}, only the first occurrence is printed".format(summary = summary,error = error),file=sys.stderr)
+    for occurrence in starts:
+      if occurrence in excluded or occurrence + duration <= self.first:
+        continue
+      self.events.append(event(occurrence,occurrence + duration,summary,allday))
+
+def contentlines(f):
+  """
+  Return the unfolded lines of an ics-file as (name, parameters, value)
+
+  @param f: The open file
+  @type  f: C(file)
+  """
+  line = None
+  for physical in f:
+    physical = physical.rstrip('\r\n')
+    if physical[:1] in (' ','\t'):    # folded line
+      if line != None:
+        line += physical[1:]
+      continue
+    if line:
+      yield splitline(line)
+    line = physical
+  if line:
+    yield splitline(line)
+
+def splitline(line):
+  """
+  Split a content line in name, parameters and value
+
+  @rtype: C((str, {str: str}, str))
+  """
+  head,sep,value = line.partition(':')
+  parts = head.split(';')
+  parameters = {}
+  for part in parts[1:]:
+    key,sep,parametervalue = part.partition('=')
+    parameters[key.upper()] = parametervalue.strip('"')
+  return parts[0].upper(),parameters,value
+
+def unescape(text):
+  """
+  Return the text of a TEXT value without the escapes
+  """
+  return re.sub(r'\\(.)',lambda match: ' ' if match.group(1) in 'nN' else match.group(1),text)
+
+def parsedatetime(parameters,value):
+  """
+  Return the moment of a DATE or DATE-TIME value, and if it is a DATE
+
+  @rtype: C((datetime.datetime, bool))
+  """
+  value = value.strip()
+  # slicing is a lot faster than strptime, which matters for large calendars
+  if parameters.get('VALUE') == 'DATE' or len(value) == 8:
+    return datetime.datetime(int(value[0:4]),int(value[4:6]),int(value[6:8])),True
+  return datetime.datetime(int(value[0:4]),int(value[4:6]),int(value[6:8]),int(value[9:11]),int(value[11:13]),int(value[13:15])),False
+
+def parseduration(value):
+  """
+  Return a DURATION value, eg P1DT2H or PT15M
+
+  @rtype: C(datetime.timedelta)
+  """
+  match = re.match(r'([+-]?)P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$',value.strip())
+  if not match:
+    return datetime.timedelta()
+  sign,weeks,days,hours,minutes,seconds = match.groups()
+  duration = datetime.timedelta(weeks=int(weeks or 0),days=int(days or 0),hours=int(hours or 0),
+                                minutes=int(minutes or 0),seconds=int(seconds or 0))
+  if sign == '-':
+    return -duration
+  return duration
+
+weekdays = {'MO':0,'TU':1,'WE':2,'TH':3,'FR':4,'SA':5,'SU':6}
+rruleparts = set(('FREQ','INTERVAL','COUNT','UNTIL','BYDAY','BYMONTHDAY','BYMONTH','BYSETPOS','WKST'))
+weekdaypattern = re.compile(r'([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+
+def recurrences(start,rule,until,after=None):
+  """
+  Return the starts of all occurrences of a recurring event, before until.
+  Without COUNT, the periods before after are skipped without making their occurrences,
+  so an event which started years ago costs no more than a new one.
+
+  @param start: The start of the first occurrence
+  @type  start: C(datetime.datetime)
+
+  @param rule: The RRULE value, eg FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE or FREQ=YEARLY;BYMONTH=11;BYDAY=4TH
+  @type  rule: C(str)
+
+  @param until: No occurrences from this moment
+  @type  until: C(datetime.datetime)
+
+  @param after: Occurrences which start before this moment may be left out, None to start at start
+  @type  after: C(datetime.datetime)
+
+  @return: The starts, in time order
+  @rtype:  C([datetime.datetime])
+
+  @raise ValueError: The rule has parts which are not supported, eg FREQ=HOURLY or BYWEEKNO
+  """
+  parts = dict(part.partition('=')[::2] for part in rule.upper().split(';') if part)
+  unknown = set(parts) - rruleparts
+  if unknown:
+    raise ValueError("RRULE parts not supported: " + ','.join(sorted(unknown)))
+  frequency = parts.get('FREQ','DAILY')
+  if frequency not in ('DAILY','WEEKLY','MONTHLY','YEARLY'):
+    raise ValueError("RRULE FREQ not supported: " + frequency)
+  interval = max(1,int(parts.get('INTERVAL','1')))
+  count = int(parts['COUNT']) if 'COUNT' in parts else None
+  if 'UNTIL' in parts:
+    until = min(until,parsedatetime({},parts['UNTIL'])[0] + datetime.timedelta(seconds=1))
+  byday = []     # (ordinal, weekday), ordinal 0 for every such weekday
+  for day in parts.get('BYDAY','').split(','):
+    match = weekdaypattern.match(day)
+    if day and not match:
+      raise ValueError("RRULE BYDAY not supported: " + day)
+    if match:
+      byday.append((int(match.group(1) or 0),weekdays[match.group(2)]))
+  if frequency in ('DAILY','WEEKLY') and any(ordinal for ordinal,weekday in byday):
+    raise ValueError("RRULE BYDAY with a number needs FREQ=MONTHLY or YEARLY")
+  rules = (byday,numbers(parts,'BYMONTHDAY'),numbers(parts,'BYMONTH'),numbers(parts,'BYSETPOS'))
+  result = []
+  period = 0
+  if count == None and after != None and after > start:
+    period = firstperiod(start,frequency,interval,after)
+  skipped = period
+  while True:
+    first,days = perioddays(start,frequency,interval * period,rules)
+    if first == None or datetime.datetime.combine(first,datetime.time()) >= until:
+      break
+    for day in days:
+      candidate = datetime.datetime.combine(day,start.time())
+      if candidate < start:
+        continue
+      if candidate >= until:
+        break
+      result.append(candidate)
+      if count != None and len(result) >= count:
+        return result
+    period += 1
+    if period - skipped > 100000:    # safety net for broken rules
+      break
+  return result
+
+def numbers(parts,name):
+  """
+  Return the numbers of a part of a RRULE, eg BYMONTHDAY=1,-1
+
+  @rtype: C([int])
+  """
+  try:
+    return [int(number) for number in parts.get(name,'').split(',') if number]
+  except ValueError:
+    raise ValueError("RRULE {name} is not a list of numbers".format(name = name))
+
+def perioddays(start,frequency,offset,rules):
+  """
+  Return the first day of a period of a recurrence (the day of start, its week, month or year),
+  and the days in the period which are selected by the rules, sorted
+
+  @param offset: The number of days, weeks, months or years from the period of start
+  @type  offset: C(int)
+
+  @param rules: The BYDAY, BYMONTHDAY, BYMONTH and BYSETPOS parts of the RRULE
+  @type  rules: C(([(int, int)], [int], [int], [int]))
+
+  @return: The first day of the period, None after the last year possible, and the days
+  @rtype:  C((datetime.date, [datetime.date]))
+  """
+  byday,bymonthday,bymonth,bysetpos = rules
+  if frequency == 'DAILY':
+    first = start.date() + datetime.timedelta(days=offset)
+    days = selectdays([first],byday,bymonthday)
+  elif frequency == 'WEEKLY':
+    weekstart = start.date() + datetime.timedelta(weeks=offset)
+    first = weekstart - datetime.timedelta(days=weekstart.weekday())    # weeks start on monday
+    if byday:
+      days = [first + datetime.timedelta(days=weekday) for weekday in sorted(set(weekday for ordinal,weekday in byday))]
+    else:
+      days = [weekstart]
+    days = selectdays(days,[],bymonthday)
+  elif frequency == 'MONTHLY':
+    month = start.month - 1 + offset
+    if start.year + month // 12 > datetime.MAXYEAR:
+      return None,[]
+    first = datetime.date(start.year + month // 12,month % 12 + 1,1)
+    days = monthdays(first,start.day,byday,bymonthday)
+  else:   # YEARLY
+    if start.year + offset > datetime.MAXYEAR:
+      return None,[]
+    first = datetime.date(start.year + offset,1,1)
+    if byday and not bymonth and not bymonthday:     # eg 20MO, the number counts in the year
+      last = datetime.date(first.year,12,31)
+      days = [first + datetime.timedelta(days=day) for day in range((last - first).days + 1)]
+      days = selectdays(days,byday,[],first,last)
+    else:
+      months = bymonth or (range(1,13) if byday or bymonthday else [start.month])
+      days = []
+      for month in sorted(months):
+        days.extend(monthdays(first.replace(month=month),start.day,byday,bymonthday))
+  if bymonth and frequency != 'YEARLY':
+    days = [day for day in days if day.month in bymonth]
+  if bysetpos:
+    days = sorted(set(days[position - 1 if position > 0 else position] for position in bysetpos
+                      if position != 0 and -len(days) <= position <= len(days)))
+  return first,days
+
+def monthdays(first,startday,byday,bymonthday):
+  """
+  Return the days of the month of first which are selected by BYDAY and BYMONTHDAY,
+  or the day startday when there are neither (nothing when the month is too short)
+
+  @rtype: C([datetime.date])
+  """
+  following = (first + datetime.timedelta(days=31)).replace(day=1)
+  last = following - datetime.timedelta(days=1)
+  if byday or bymonthday:
+    days = [first + datetime.timedelta(days=day) for day in range(last.day)]
+    return selectdays(days,byday,bymonthday,first,last)
+  if startday > last.day:
+    return []
+  return [first.replace(day=startday)]
+
+def selectdays(days,byday,bymonthday,first=None,last=None):
+  """
+  Return the days which match BYDAY and BYMONTHDAY (negative numbers count from the end).
+  The number of a weekday in BYDAY counts from first or back from last, eg 4TH or -1SU.
+
+  @rtype: C([datetime.date])
+  """
+  selected = []
+  for day in days:
+    if bymonthday:
+      length = ((day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)).day
+      if day.day not in bymonthday and day.day - length - 1 not in bymonthday:
+        continue
+    if byday:
+      matched = False
+      for ordinal,weekday in byday:
+        if day.weekday() != weekday:
+          continue
+        if ordinal == 0 or ordinal == (day - first).days // 7 + 1 or ordinal == -((last - day).days // 7 + 1):
+          matched = True
+      if not matched:
+        continue
+    selected.append(day)
+  return selected
+
+def firstperiod(start,frequency,interval,after):
+  """
+  Return the period of a recurrence in which after is, all occurrences of the periods
+  before it start before after (see the candidates in recurrences())
+
+  @rtype: C(int)
+  """
+  if frequency == 'DAILY':
+    return (after - start).days // interval
+  if frequency == 'WEEKLY':     # the week of a period starts at or before its weekstart
+    return (after - start).days // (7 * interval)
+  if frequency == 'MONTHLY':
+    return ((after.year - start.year) * 12 + after.month - start.month) // interval
+  return (after.year - start.year) // interval
@@ -0,0 +1,169 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+
+class outputcache:
+  """
+  A directory with finished files, named after the hash of everything that determines their contents.
+  When the directory gets larger than maxsize, the least recently used files are removed.
+
+  @ivar directory: The directory of the cache
+  @type directory: C(str)
+
+  @ivar maxsize: The maximum size of all files in the cache, in bytes
+  @type maxsize: C(int)
+  """
+  def __init__(self,directory,maxsize=500*1024*1024):
+    self.directory = directory
+    self.maxsize = maxsize
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+
+  def key(self,*parts):
+    """
+    Return the key of a file, the hash of the parts
+
+    @param parts: Everything that determines the contents of the file, each with a stable repr()
+    @type  parts: C(tuple)
+
+    @rtype: C(str)
+    """
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+  def path(self,key,extension='.pdf'):
+    """
+    Return the name of the file in the cache
+
+    @rtype: C(str)
+    """
+    return os.path.join(self.directory,key + extension)
+
+  def fetch(self,key,filename,extension='.pdf'):
+    """
+    Put the file from the cache at filename, as a hard link when possible
+
+    @param key: The key of the file
+    @type  key: C(str)
+
+    @param filename: Where the file is wanted
+    @type  filename: C(str)
+
+    @return: False when the file is not in the cache
+    @rtype:  C(bool)
+    """
+    cached = self.path(key,extension)
+    if not os.path.exists(cached):
+      return False
+    os.utime(cached)    # recently used
+    if os.path.exists(filename):
+      if os.path.samefile(cached,filename):
+        return True
+      os.remove(filename)
+    try:
+      os.link(cached,filename)
+    except OSError:     # other file system, or no hard links
+      shutil.copyfile(cached,filename)
+    return True
+
+  def copy(self,key,stream,extension='.pdf'):
+    """
+    Write the file from the cache to a binary stream
+
+    @param key: The key of the file
+    @type  key: C(str)
+
+    @param stream: Where the file is wanted
+    @type  stream: C(file)
+
+    @return: False when the file is not in the cache
+    @rtype:  C(bool)
+    """
+    cached = self.path(key,extension)
+    try:
+      f = open(cached,'rb')
+    except OSError:
+      return False
+    with f:
+      os.utime(cached)    # recently used
+      shutil.copyfileobj(f,stream)
+    return True
+
+  def store(self,key,filename,extension='.pdf'):
+    """
+    Put a new file in the cache, and remove old files when the cache is too large
+
+    @param key: The key of the file
+    @type  key: C(str)
+
+    @param filename: The file to store
+    @type  filename: C(str)
+    """
+    # write to a temporary name first, so other processes never see half a file
+    handle,temporary = tempfile.mkstemp(dir=self.directory,suffix='.tmp')
+    os.close(handle)
+    os.remove(temporary)
+    try:
+      os.link(filename,temporary)
+    except OSError:
+      shutil.copyfile(filename,temporary)
+    os.replace(temporary,self.path(key,extension))
+    self.evict()
+
+  def storedata(self,key,data,extension='.pdf'):
+    """
+    Put the contents of a new file in the cache, and remove old files when the cache is too large
+
+    @param key: The key of the file
+    @type  key: C(str)
+
+    @param data: The contents of the file
+    @type  data: C(bytes)
+    """
+    handle,temporary = tempfile.mkstemp(dir=self.directory,suffix='.tmp')
+    with os.fdopen(handle,'wb') as f:
+      f.write(data)
+    os.replace(temporary,self.path(key,extension))
+    self.evict()
+
+  def evict(self):
+    """
+    Remove the least recently used files, until the cache is not larger than maxsize
+    """
+    files = []
+    for name in glob.glob(os.path.join(self.directory,'*')):
+      if name.endswith('.tmp'):
+        continue
+      try:
+        status = os.stat(name)
+      except OSError:     # removed by another process
+        continue
+      files.append((status.st_mtime,status.st_size,name))
+    total = sum(size for mtime,size,name in files)
+    for mtime,size,name in sorted(files):
+      if total <= self.maxsize:
+        break
+      try:
+        os.remove(name)
+      except OSError:
+        pass
+      total -= size
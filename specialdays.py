@@ -0,0 +1,269 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Public holidays, Easter-derived feasts, the days daylight saving time starts and ends,
+and the week numbers, per country.
+The rules of a country are computed once per year, and the labels once per language,
+so a batch of agendas for many years and locales shares them.
+The Korean holidays of the lunar calendar (Seollal, Buddha's birthday, Chuseok) are not included.
+"""
+import datetime
+
+def easter(year):
+  """
+  Return easter sunday of a year (Gregorian, anonymous algorithm)
+
+  @param year: The year
+  @type  year: C(int)
+
+  @rtype: C(datetime.date)
+  """
+  a = year % 19
+  b,c = divmod(year,100)
+  d,e = divmod(b,4)
+  f = (b + 8) // 25
+  g = (b - f + 1) // 3
+  h = (19 * a + b - d - g + 15) % 30
+  i,k = divmod(c,4)
+  l = (32 + 2 * e + 2 * i - h - k) % 7
+  m = (a + 11 * h + 22 * l) // 451
+  month,day = divmod(h + l - 7 * m + 114,31)
+  return datetime.date(year,month,day + 1)
+
+def nthweekday(year,month,weekday,n):
+  """
+  Return the n-th weekday of a month, n=-1 is the last one
+
+  @param weekday: Monday is 0, Sunday is 6
+  @type  weekday: C(int)
+
+  @rtype: C(datetime.date)
+  """
+  if n > 0:
+    first = datetime.date(year,month,1)
+    return first + ((weekday - first.weekday()) % 7 + (n - 1) * 7) * datetime.date.resolution
+  if month == 12:
+    last = datetime.date(year,12,31)
+  else:
+    last = datetime.date(year,month + 1,1) - datetime.date.resolution
+  return last - ((last.weekday() - weekday) % 7 - (n + 1) * 7) * datetime.date.resolution
+
+def netherlands(year):
+  """
+  Return the special days of the Netherlands as (date, name)
+
+  @rtype: C([(datetime.date, str)])
+  """
+  sunday = easter(year)
+  days = [(datetime.date(year,1,1),'newyear'),
+          (sunday - 2 * datetime.date.resolution,'goodfriday'),
+          (sunday,'easter'),
+          (sunday + datetime.date.resolution,'eastermonday'),
+          (sunday + 39 * datetime.date.resolution,'ascension'),
+          (sunday + 49 * datetime.date.resolution,'pentecost'),
+          (sunday + 50 * datetime.date.resolution,'whitmonday'),
+          (datetime.date(year,5,5),'liberation'),
+          (datetime.date(year,12,25),'christmas'),
+          (datetime.date(year,12,26),'boxingday'),
+          (nthweekday(year,3,6,-1),'summertime'),     # EU rules
+          (nthweekday(year,10,6,-1),'wintertime')]
+  if year >= 2014:
+    kingsday = datetime.date(year,4,27)
+    if kingsday.weekday() == 6:
+      kingsday -= datetime.date.resolution
+    days.append((kingsday,'kingsday'))
+  else:
+    queensday = datetime.date(year,4,30)
+    if queensday.weekday() == 6:
+      queensday -= datetime.date.resolution
+    days.append((queensday,'queensday'))
+  return days
+
+def unitedstates(year):
+  """
+  Return the special days of the United States as (date, name), the federal holidays
+
+  @rtype: C([(datetime.date, str)])
+  """
+  days = [(datetime.date(year,1,1),'newyear'),
+          (nthweekday(year,1,0,3),'mlkday'),
+          (nthweekday(year,2,0,3),'presidentsday'),
+          (easter(year),'easter'),
+          (nthweekday(year,5,0,-1),'memorialday'),
+          (datetime.date(year,7,4),'independenceday'),
+          (nthweekday(year,9,0,1),'laborday'),
+          (nthweekday(year,10,0,2),'columbusday'),
+          (datetime.date(year,11,11),'veteransday'),
+          (nthweekday(year,11,3,4),'thanksgiving'),
+          (datetime.date(year,12,25),'christmas')]
+  if year >= 2021:
+    days.append((datetime.date(year,6,19),'juneteenth'))
+  if year >= 2007:
+    days.append((nthweekday(year,3,6,2),'summertime'))
+    days.append((nthweekday(year,11,6,1),'wintertime'))
+  else:
+    days.append((nthweekday(year,4,6,1),'summertime'))
+    days.append((nthweekday(year,10,6,-1),'wintertime'))
+  return days
+
+def korea(year):
+  """
+  Return the special days of South Korea as (date, name), without the holidays of the lunar calendar
+
+  @rtype: C([(datetime.date, str)])
+  """
+  return [(datetime.date(year,1,1),'newyear'),
+          (datetime.date(year,3,1),'independencemovement'),
+          (datetime.date(year,5,5),'childrensday'),
+          (datetime.date(year,6,6),'memorialday'),
+          (datetime.date(year,8,15),'liberation'),
+          (datetime.date(year,10,3),'foundationday'),
+          (datetime.date(year,10,9),'hangulday'),
+          (datetime.date(year,12,25),'christmas')]
+
+def isoweek(day):
+  """
+  Return the ISO 8601 week number, weeks start on monday and week 1 has the first thursday
+  """
+  return day.isocalendar()[1]
+
+def usweek(day):
+  """
+  Return the week number as used in the US, weeks start on sunday and week 1 has new years day
+  """
+  newyearsday = datetime.date(day.year,1,1)
+  return ((day - newyearsday).days + (newyearsday.weekday() + 1) % 7) // 7 + 1
+
+# country -> (rules, week number)
+countries = {'NL':(netherlands,isoweek),
+             'US':(unitedstates,usweek),
+             'KR':(korea,isoweek)}
+
+# language -> name -> label
+labels = {'nl':{'newyear':'Nieuwjaarsdag','goodfriday':'Goede Vrijdag','easter':'Eerste Paasdag','eastermonday':'Tweede Paasdag',
+                'ascension':'Hemelvaartsdag','pentecost':'Eerste Pinksterdag','whitmonday':'Tweede Pinksterdag',
+                'liberation':'Bevrijdingsdag','christmas':'Eerste Kerstdag','boxingday':'Tweede Kerstdag',
+                'kingsday':'Koningsdag','queensday':'Koninginnedag','summertime':'Zomertijd','wintertime':'Wintertijd'},
+          'fy':{'newyear':'Nijjiersdei','goodfriday':'Goede Freed','easter':'Earste Peaskedei','eastermonday':'Twadde Peaskedei',
+                'ascension':'Himelfeartsdei','pentecost':'Earste Pinksterdei','whitmonday':'Twadde Pinksterdei',
+                'liberation':'Befrijingsdei','christmas':'Earste Krystdei','boxingday':'Twadde Krystdei',
+                'kingsday':'Keningsdei','queensday':'Keninginnedei','summertime':'Simmertiid','wintertime':'Wintertiid'},
+          'en':{'newyear':"New Year's Day",'goodfriday':'Good Friday','easter':'Easter','eastermonday':'Easter Monday',
+                'ascension':'Ascension Day','pentecost':'Pentecost','whitmonday':'Whit Monday',
+                'liberation':'Liberation Day','christmas':'Christmas Day','boxingday':'Boxing Day',
+                'kingsday':"King's Day",'queensday':"Queen's Day",'summertime':'Daylight saving time starts',
+                'wintertime':'Daylight saving time ends','mlkday':'Martin Luther King Jr. Day',
+                'presidentsday':"Presidents' Day",'memorialday':'Memorial Day','juneteenth':'Juneteenth',
+                'independenceday':'Independence Day','laborday':'Labor Day','columbusday':'Columbus Day',
+                'veteransday':'Veterans Day','thanksgiving':'Thanksgiving Day',
+                'independencemovement':'Independence Movement Day','childrensday':"Children's Day",
+                'foundationday':'National Foundation Day','hangulday':'Hangul Day'},
+          'ko':{'newyear':'신정','independencemovement':'삼일절','childrensday':'어린이날','memorialday':'현충일',
+                'liberation':'광복절','foundationday':'개천절','hangulday':'한글날','christmas':'기독탄신일'}}
+
+def localecountry(localename):
+  """
+  Return the country of a locale name (eg nl_NL.UTF8 -> NL), or None when it has no rules
+
+  @param localename: The name of the locale, None for none
+  @type  localename: C(str)
+
+  @rtype: C(str)
+  """
+  if localename == None:
+    return None
+  territory = localename.split('.')[0].split('@')[0].partition('_')[2].upper()
+  if territory in countries:
+    return territory
+  return None
+
+rulestables = {}    # (country,year) -> [(date ordinal, name)], shared by all agendas made in this process
+labeltables = {}    # (country,language,year) -> {date ordinal: label}
+
+def specialdays(country,year):
+  """
+  Return the special days of a country in a year, computed only once
+
+  @param country: The country, a key of countries
+  @type  country: C(str)
+
+  @rtype: C([(int, str)])
+  """
+  key = (country,year)
+  if key not in rulestables:
+    rules = countries[country][0]
+    rulestables[key] = sorted((day.toordinal(),name) for day,name in rules(year))
+  return rulestables[key]
+
+def labeltable(country,language,year):
+  """
+  Return the labels of the special days of a country in a year, in a language, made only once.
+  Names without a translation in the language are in English.
+
+  @param country: The country, a key of countries
+  @type  country: C(str)
+
+  @param language: The language, eg 'nl' (the first part of a locale name)
+  @type  language: C(str)
+
+  @return: date ordinal -> label, more special days on one date are joined with a comma
+  @rtype:  C({int: str})
+  """
+  key = (country,language,year)
+  if key not in labeltables:
+    names = labels.get(language,{})
+    table = {}
+    for ordinal,name in specialdays(country,year):
+      label = names.get(name,labels['en'][name])
+      if ordinal in table:
+        label = table[ordinal] + ', ' + label
+      table[ordinal] = label
+    labeltables[key] = table
+  return labeltables[key]
+
+class holidays:
+  """
+  The special days and week numbers of a country, in the language of a locale
+
+  @ivar country: The country, a key of countries
+  @type country: C(str)
+
+  @ivar language: The language of the labels
+  @type language: C(str)
+  """
+  def __init__(self,country,localename):
+    self.country = country
+    self.language = (localename or 'en').split('_')[0].split('.')[0].lower()
+
+  def label(self,day):
+    """
+    Return the label of a day, or None when it is not a special day
+
+    @param day: The day
+    @type  day: C(datetime.date)
+
+    @rtype: C(str)
+    """
+    return labeltable(self.country,self.language,day.year).get(day.toordinal())
+
+  def week(self,day):
+    """
+    Return the week number of a day, by the rules of the country
+
+    @rtype: C(int)
+    """
+    return countries[self.country][1](day)
@@ -0,0 +1,93 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Tests of the layout of the agenda pages on the papers, with signatures
+"""
+import unittest
+import filofaxDIY
+from xfiglib import nullout
+
+def makefilofax(paper,orient,signature):
+  return filofaxDIY.filofax(None,'Helvetica',4,filofaxDIY.allowedpapers[paper],orient,None,filofaxDIY.agendasizes['Personal'],
+                            nullout.nulldocument(),0,signature)
+
+class signaturetests(unittest.TestCase):
+
+  # paper, orientation and the number of folios on one side of the paper
+  papers = (('A4','Portrait',1),('A3','Landscape',2),('A3','Portrait',2))
+
+  def test_folios(self):
+    "pages n-1-2f and 2f next to each other on the even side, 2f+1 and n-2-2f behind them"
+    for paper,orient,folios in self.papers:
+      for n in (4,8,16):
+        agenda = makefilofax(paper,orient,n)
+        self.assertEqual(agenda.agendapagesperpage // 2,folios)
+        agenda.layout(3 * n)
+        for signature in range(3):
+          base = signature * n
+          for f in range(n // 4):
+            message = (paper,orient,n,signature,f)
+            left,right = base + n - 1 - 2 * f,base + 2 * f
+            behindright,behindleft = base + 2 * f + 1,base + n - 2 - 2 * f
+            sheet = agenda.pagesheet[right]
+            for page in (left,behindright,behindleft):
+              self.assertEqual(agenda.pagesheet[page],sheet,message)
+            self.assertEqual((agenda.pageside[left],agenda.pageside[right]),(1,1),message)
+            self.assertEqual((agenda.pageside[behindright],agenda.pageside[behindleft]),(0,0),message)
+            # next to each other, the fold between them
+            self.assertEqual(agenda.pagey[left],agenda.pagey[right],message)
+            self.assertAlmostEqual(agenda.pagex[left] + agenda.agendawidth,agenda.pagex[right],msg=message)
+            self.assertEqual(agenda.pageslot[left] + 1,agenda.pageslot[right],message)
+            # behind them in the mirrored slot
+            for front,back in ((right,behindright),(left,behindleft)):
+              self.assertEqual(agenda.pageslot[front],agenda.pageslot[back],message)
+              self.assertEqual(agenda.pagey[front],agenda.pagey[back],message)
+              self.assertAlmostEqual(agenda.pagex[back],agenda.paperwidth - agenda.pagex[front] - agenda.agendawidth,msg=message)
+
+  def test_sheets_in_order(self):
+    "the sheets of a signature follow the sheets of the signature before, the first folio first, and no agenda pages are on the same place"
+    for paper,orient,folios in self.papers:
+      for n in (4,8,16):
+        agenda = makefilofax(paper,orient,n)
+        agenda.layout(5 * n)
+        previous = 0
+        places = set()
+        for signature in range(5):
+          pages = range(signature * n,(signature + 1) * n)
+          sheets = sorted(set(agenda.pagesheet[page] for page in pages))
+          self.assertGreaterEqual(sheets[0],previous,(paper,orient,n,signature))
+          self.assertEqual(sheets,list(range(sheets[0],sheets[-1] + 1)),(paper,orient,n,signature))
+          previous = sheets[-1]
+          for page in pages:
+            place = (agenda.pagesheet[page],agenda.pageside[page],agenda.pageslot[page])
+            self.assertNotIn(place,places,(paper,orient,n,page))
+            places.add(place)
+        # the papers are made when their first agenda page is drawn, pdfsheets counts them in that order
+        firsts = []
+        for sheet in agenda.pagesheet:
+          if sheet not in firsts:
+            firsts.append(sheet)
+        self.assertEqual(firsts,list(range(len(firsts))),(paper,orient,n))
+
+  def test_no_signatures(self):
+    "without signatures the sheets are filled one after the other"
+    agenda = makefilofax('A4','Portrait',0)
+    agenda.layout(20)
+    self.assertEqual(list(agenda.pagesheet),sorted(agenda.pagesheet))
+
+if __name__ == '__main__':
+  unittest.main()
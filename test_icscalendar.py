@@ -0,0 +1,158 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Tests of the interval index and the recurrence rules of icscalendar
+"""
+import io
+import os
+import random
+import contextlib
+import datetime
+import tempfile
+import unittest
+import icscalendar
+
+def moment(year,month,day,hour=0):
+  return datetime.datetime(year,month,day,hour)
+
+def readcalendar(contents,first,last):
+  """
+  Return the calendar of an ics-file with the lines contents
+  """
+  handle,filename = tempfile.mkstemp(suffix='.ics')
+  with os.fdopen(handle,'w') as f:
+    f.write('\r\n'.join(contents))
+  try:
+    return icscalendar.calendar([filename],first,last)
+  finally:
+    os.remove(filename)
+
+class intervalindextests(unittest.TestCase):
+
+  def test_overlap(self):
+    "find() gives the same intervals as checking all of them"
+    generator = random.Random(2024)
+    intervals = []
+    for item in range(500):
+      start = generator.uniform(0,1000)
+      intervals.append((start,start + generator.choice((0.01,0.5,1,3,30,400)),item))
+    index = icscalendar.intervalindex(intervals)
+    for low in range(-10,1010,7):
+      for length in (0.5,1,10):
+        expected = sorted(item for start,end,item in intervals if start < low + length and end > low)
+        self.assertEqual(sorted(index.find(low,low + length)),expected)
+
+  def test_bounds(self):
+    "an interval includes its start and not its end"
+    index = icscalendar.intervalindex([(1,2,'a'),(2,3,'b'),(2.5,2.75,'c')])
+    self.assertEqual(sorted(index.find(2,3)),['b','c'])
+    self.assertEqual(index.find(0,1),[])
+    self.assertEqual(sorted(index.find(1.5,2.5)),['a','b'])
+    self.assertEqual(index.find(3,4),[])
+
+  def test_empty(self):
+    self.assertEqual(icscalendar.intervalindex([]).find(0,10),[])
+
+class recurrencestests(unittest.TestCase):
+
+  def test_daily(self):
+    starts = icscalendar.recurrences(moment(2024,1,30,9),'FREQ=DAILY;INTERVAL=2',moment(2024,2,6))
+    self.assertEqual(starts,[moment(2024,1,30,9),moment(2024,2,1,9),moment(2024,2,3,9),moment(2024,2,5,9)])
+
+  def test_weekly_byday(self):
+    starts = icscalendar.recurrences(moment(2024,1,3),'FREQ=WEEKLY;BYDAY=MO,WE,FR',moment(2024,1,16))
+    self.assertEqual(starts,[moment(2024,1,3),moment(2024,1,5),moment(2024,1,8),moment(2024,1,10),moment(2024,1,12),
+                             moment(2024,1,15)])
+
+  def test_monthly_skips_missing_days(self):
+    starts = icscalendar.recurrences(moment(2024,1,31),'FREQ=MONTHLY',moment(2024,6,1))
+    self.assertEqual(starts,[moment(2024,1,31),moment(2024,3,31),moment(2024,5,31)])
+
+  def test_yearly_leap_day(self):
+    starts = icscalendar.recurrences(moment(2020,2,29),'FREQ=YEARLY',moment(2030,1,1))
+    self.assertEqual(starts,[moment(2020,2,29),moment(2024,2,29),moment(2028,2,29)])
+
+  def test_count_and_until(self):
+    self.assertEqual(len(icscalendar.recurrences(moment(2024,1,1),'FREQ=WEEKLY;COUNT=5',moment(2025,1,1))),5)
+    starts = icscalendar.recurrences(moment(2024,1,1),'FREQ=DAILY;UNTIL=20240103',moment(2025,1,1))
+    self.assertEqual(starts,[moment(2024,1,1),moment(2024,1,2),moment(2024,1,3)])
+
+  def test_byday_number(self):
+    "the fourth thursday of november, and the last monday of may"
+    starts = icscalendar.recurrences(moment(2010,11,25),'FREQ=YEARLY;BYMONTH=11;BYDAY=4TH',moment(2030,1,1),moment(2027,1,1))
+    self.assertEqual([s for s in starts if s.year >= 2027],[moment(2027,11,25),moment(2028,11,23),moment(2029,11,22)])
+    starts = icscalendar.recurrences(moment(2024,5,27),'FREQ=YEARLY;BYMONTH=5;BYDAY=-1MO',moment(2027,1,1))
+    self.assertEqual(starts,[moment(2024,5,27),moment(2025,5,26),moment(2026,5,25)])
+    starts = icscalendar.recurrences(moment(2024,1,1),'FREQ=MONTHLY;BYDAY=1FR,-1FR;COUNT=4',moment(2025,1,1))
+    self.assertEqual(starts,[moment(2024,1,5),moment(2024,1,26),moment(2024,2,2),moment(2024,2,23)])
+
+  def test_bymonthday(self):
+    "the last day of every month, also of short months"
+    starts = icscalendar.recurrences(moment(2028,1,31,18),'FREQ=MONTHLY;BYMONTHDAY=-1',moment(2028,6,1))
+    self.assertEqual(starts,[moment(2028,1,31,18),moment(2028,2,29,18),moment(2028,3,31,18),moment(2028,4,30,18),
+                             moment(2028,5,31,18)])
+    starts = icscalendar.recurrences(moment(2024,1,1),'FREQ=MONTHLY;BYMONTHDAY=1,15;COUNT=3',moment(2025,1,1))
+    self.assertEqual(starts,[moment(2024,1,1),moment(2024,1,15),moment(2024,2,1)])
+
+  def test_bysetpos(self):
+    "the last working day of the month"
+    starts = icscalendar.recurrences(moment(2024,1,1),'FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1',moment(2024,4,1))
+    self.assertEqual(starts,[moment(2024,1,31),moment(2024,2,29),moment(2024,3,29)])
+
+  def test_unsupported(self):
+    for rule in ('FREQ=YEARLY;BYWEEKNO=20','FREQ=HOURLY','FREQ=WEEKLY;BYDAY=2MO','FREQ=MONTHLY;BYDAY=XX'):
+      self.assertRaises(ValueError,icscalendar.recurrences,moment(2024,1,1),rule,moment(2025,1,1))
+
+  def test_after(self):
+    "skipping the periods before after gives the same occurrences from after on"
+    until = moment(2026,1,1)
+    for rule in ('FREQ=DAILY','FREQ=DAILY;INTERVAL=3','FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,SU','FREQ=WEEKLY;BYDAY=MO,SA',
+                 'FREQ=WEEKLY','FREQ=MONTHLY','FREQ=MONTHLY;INTERVAL=5','FREQ=YEARLY','FREQ=YEARLY;INTERVAL=3',
+                 'FREQ=DAILY;COUNT=8000','FREQ=MONTHLY;BYMONTHDAY=-1','FREQ=YEARLY;BYMONTH=11;BYDAY=4TH',
+                 'FREQ=MONTHLY;INTERVAL=2;BYDAY=-1SU','FREQ=DAILY;BYDAY=SA,SU'):
+      for start in (moment(2005,3,31,23),moment(2012,7,4),moment(2023,12,31,12),moment(2024,1,1),moment(2024,6,15)):
+        for after in (moment(2024,1,1),moment(2024,3,14,15),moment(2024,7,4),moment(2024,7,31,23),moment(2025,6,15)):
+          all = [s for s in icscalendar.recurrences(start,rule,until) if s >= after]
+          self.assertEqual([s for s in icscalendar.recurrences(start,rule,until,after) if s >= after],all,(rule,start,after))
+
+class calendartests(unittest.TestCase):
+
+  def test_events(self):
+    "an old daily event is on every day of the agenda, except the excluded one, and a long event on all its days"
+    contents = ['BEGIN:VCALENDAR',
+                'BEGIN:VEVENT','DTSTART:20050301T090000','DURATION:PT30M','RRULE:FREQ=DAILY','EXDATE:20240102T090000',
+                'SUMMARY:Standup','END:VEVENT',
+                'BEGIN:VEVENT','DTSTART;VALUE=DATE:20231230','DTEND;VALUE=DATE:20240103','SUMMARY:Holiday','END:VEVENT',
+                'END:VCALENDAR']
+    calendar = readcalendar(contents,datetime.date(2024,1,1),datetime.date(2024,1,31))
+    self.assertEqual(len(calendar.events),30 + 1)
+    self.assertEqual(calendar.day(datetime.date(2024,1,1)),['Holiday','09:00 Standup'])
+    self.assertEqual(calendar.day(datetime.date(2024,1,2)),['Holiday'])
+    self.assertEqual(calendar.day(datetime.date(2024,1,3)),['09:00 Standup'])
+
+  def test_unsupported(self):
+    "an event with a rule which is not supported is only on its first day"
+    contents = ['BEGIN:VCALENDAR',
+                'BEGIN:VEVENT','DTSTART;VALUE=DATE:20240115','RRULE:FREQ=YEARLY;BYWEEKNO=3','SUMMARY:Week 3','END:VEVENT',
+                'END:VCALENDAR']
+    with contextlib.redirect_stderr(io.StringIO()) as errors:
+      calendar = readcalendar(contents,datetime.date(2024,1,1),datetime.date(2025,12,31))
+    self.assertEqual([e.start for e in calendar.events],[moment(2024,1,15)])
+    self.assertIn('BYWEEKNO',errors.getvalue())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,73 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+Tests of compact(), which removes the operators of a content stream which do not change the drawing
+"""
+import io
+import unittest
+from xfiglib import pdfout
+
+# the operators as reportlab writes them
+font1 = 'BT /F1 10 Tf 12 TL ET'
+font2 = 'BT /F2 8 Tf 9.6 TL ET'
+texta = 'BT 1 0 0 1 10 20 Tm (a) Tj T* ET'
+textb = 'BT 1 0 0 1 5 5 Tm (b) Tj T* ET'
+
+class compacttests(unittest.TestCase):
+
+  def test_unused_font(self):
+    "a font which is not used before the next font is left out"
+    self.assertEqual(pdfout.compact([font1,font2,texta]),['BT /F2 8 Tf 1 0 0 1 10 20 Tm (a) Tj ET'])
+    self.assertEqual(pdfout.compact([font1,texta,font2,textb]),
+                     ['BT /F1 10 Tf 1 0 0 1 10 20 Tm (a) Tj /F2 8 Tf 1 0 0 1 5 5 Tm (b) Tj ET'])
+
+  def test_font_stroke_text(self):
+    "a path ends the text object, the font set before it is kept for the text after it"
+    code = [font1,'2 w','n','0 0 m 1 1 l','S',texta]
+    self.assertEqual(pdfout.compact(code),['BT /F1 10 Tf ET','2 w','0 0 m 1 1 l','S','BT 1 0 0 1 10 20 Tm (a) Tj ET'])
+
+  def test_new_path(self):
+    "the n before a new path is left out, also when it is on the line of the path"
+    self.assertEqual(pdfout.compact(['n 0 0 m 1 1 l','S','n','2 2 m 3 3 l','S']),['0 0 m 1 1 l','S','2 2 m 3 3 l','S'])
+    self.assertEqual(pdfout.compact(['0 0 m 1 1 l','n']),['0 0 m 1 1 l'])
+
+  def test_identity(self):
+    "only the identity transformation is left out"
+    code = ['q','1 0 0 1 0 0 cm','1 0 0 1 5 5 cm','/FormXob.tmpl0 Do','Q']
+    self.assertEqual(pdfout.compact(code),['q','1 0 0 1 5 5 cm','/FormXob.tmpl0 Do','Q'])
+
+  def test_form_between_texts(self):
+    "a form placed between two texts is not moved into a text object"
+    self.assertEqual(pdfout.compact([texta,'/FormXob.tmpl0 Do',textb]),
+                     ['BT 1 0 0 1 10 20 Tm (a) Tj ET','/FormXob.tmpl0 Do','BT 1 0 0 1 5 5 Tm (b) Tj ET'])
+
+  def test_text_in_form(self):
+    "the texts of a template are merged in the content of its form"
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(io.BytesIO())
+    template = pdfout.pdfout(100,100)
+    template.tekst(10,10,'one',fsize=8)
+    template.tekst(10,20,'two',font='Times-Roman',fsize=8)
+    template.line(0,0,10,10)
+    template.saveform(pdf,'tmpl0')
+    stream = pdf._doc.idToObject['FormXob.tmpl0'].stream.decode()
+    self.assertIn('(one) Tj /F2 8 Tf 1 0 0 1 ',stream)
+    self.assertNotIn('T*',stream)
+    self.assertNotIn('\nn\n',stream)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,173 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+class document():
+  """
+  The output of a drawing program, with one page for every side of a paper.
+  This is the interface, see pdfout.pdfdocument and xfig.xfigdocument.
+
+  A page, as returned by newpage(), has the drawing functions of pdfout.pdfout, with coordinates
+  in mm from the top left of the paper::
+    pushorigin(dx,dy), poporigin(), setorigin(x,y)
+    line(fx,fy,dx,dy,style=0,dikte=1,gray=0)
+    circle(x,y,rad,style=0,dikte=1,gray=0)
+    tekst(x,y,text,font='Helvetica',fsize=12,align=0,gray=0)
+    image(filename,x,y,w=None,h=None)
+    placetemplate(key,draw,x=0,y=0)
+
+  Pages are written out with savepage(), in the order of the document.
+  """
+  def setinfo(self,author,creator,title,subject):
+    """
+    Set the information about the document, if the format has a place for it
+
+    @param author: The author
+    @type  author: C{str}
+
+    @param creator: The program which made the document
+    @type  creator: C{str}
+
+    @param title: The title
+    @type  title: C{str}
+
+    @param subject: The subject
+    @type  subject: C{str}
+    """
+    pass
+
+  def newpage(self,width,height):
+    """
+    Return a new empty page
+
+    @param width: Width of the paper in mm
+    @type  width: C{float}
+
+    @param height: Height of the paper in mm
+    @type  height: C{float}
+    """
+    raise NotImplementedError
+
+  def savepage(self,page):
+    """
+    Write out a page, it is not used anymore after this
+
+    @param page: A page made by newpage()
+    """
+    raise NotImplementedError
+
+  def close(self):
+    """
+    Finish the document, after the last page
+    """
+    raise NotImplementedError
+
+class multidocument(document):
+  """
+  Write the same drawing to more documents at once, eg a pdf and the xfig files
+
+  @ivar documents: The documents to write to
+  @type documents: C{[document]}
+  """
+  def __init__(self,documents):
+    self.documents = documents
+
+  def setinfo(self,author,creator,title,subject):
+    for document in self.documents:
+      document.setinfo(author,creator,title,subject)
+
+  def newpage(self,width,height):
+    return multipage([document.newpage(width,height) for document in self.documents])
+
+  def savepage(self,page):
+    for document,onepage in zip(self.documents,page.pages):
+      document.savepage(onepage)
+
+  def close(self):
+    for document in self.documents:
+      document.close()
+
+class multipage():
+  """
+  A page of a multidocument, every drawing function is done on the pages of all documents
+
+  @ivar pages: One page per document
+  @type pages: C{list}
+  """
+  def __init__(self,pages):
+    self.pages = pages
+
+  def pushorigin(self,dx,dy):
+    for page in self.pages:
+      page.pushorigin(dx,dy)
+
+  def poporigin(self):
+    for page in self.pages:
+      page.poporigin()
+
+  def setorigin(self,x,y):
+    for page in self.pages:
+      page.setorigin(x,y)
+
+  def line(self,fx,fy,dx,dy,style=0,dikte=1,gray=0):
+    for page in self.pages:
+      page.line(fx,fy,dx,dy,style,dikte,gray)
+
+  def circle(self,x,y,rad,style=0,dikte=1,gray=0):
+    for page in self.pages:
+      page.circle(x,y,rad,style,dikte,gray)
+
+  def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
+    for page in self.pages:
+      page.tekst(x,y,text,font,fsize,align,gray)
+
+  def image(self,filename,x,y,w = None,h = None):
+    for page in self.pages:
+      page.image(filename,x,y,w,h)
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    # every page makes its own template, with draw()
+    for page in self.pages:
+      page.placetemplate(key,draw,x,y)
+
+class nullpage():
+  """
+  A page which draws nothing, for pages of which only the layout matters
+  """
+  def pushorigin(self,dx,dy):
+    pass
+
+  def poporigin(self):
+    pass
+
+  def setorigin(self,x,y):
+    pass
+
+  def line(self,fx,fy,dx,dy,style=0,dikte=1,gray=0):
+    pass
+
+  def circle(self,x,y,rad,style=0,dikte=1,gray=0):
+    pass
+
+  def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
+    pass
+
+  def image(self,filename,x,y,w = None,h = None):
+    pass
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    pass     # the template is not drawn either
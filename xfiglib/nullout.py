@@ -0,0 +1,139 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+A document which draws nothing and writes nothing, it only counts the pages, the agenda pages
+on them and the draw actions. The layout of an agenda can be planned with it, without rendering.
+"""
+import os
+import collections
+from xfiglib import backend
+
+# estimated bytes in a pdf-file made by pdfout (compressed), fitted on agendas of all sizes, within 7%
+pdfbytes = {'file':5300,     # the header, fonts, info and cross reference table
+            'page':590,      # the page object, and the header and day names on it
+            'form':290,      # the form object of a template
+            'line':9,
+            'circle':55,
+            'char':2,
+            'template':10}   # the placement of a template
+imagefactor = 1.25    # reportlab writes the pixels of an image again, not the file
+
+class countpage(backend.nullpage):
+  """
+  A page which draws nothing, and counts what would be drawn
+
+  @ivar counts: Number of draw actions per kind (line, circle, text, image, template), and the characters
+  @type counts: C{collections.Counter}
+
+  @ivar slots: Number of agenda pages started on this page with setorigin()
+  @type slots: C{int}
+
+  @ivar used: Number of agenda pages which got a drawing
+  @type used: C{int}
+  """
+  def __init__(self,templates):
+    self.templates = templates
+    self.counts = collections.Counter()
+    self.images = set()
+    self.slots = 0
+    self.used = 0
+    self.drawn = True      # what is drawn before the first agenda page is not in a slot
+
+  def setorigin(self,x,y):
+    self.slots += 1
+    self.drawn = False
+
+  def count(self,kind):
+    self.counts[kind] += 1
+    if not self.drawn:
+      self.used += 1
+      self.drawn = True
+
+  def line(self,fx,fy,dx,dy,style=0,dikte=1,gray=0):
+    self.count('line')
+
+  def circle(self,x,y,rad,style=0,dikte=1,gray=0):
+    self.count('circle')
+
+  def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
+    self.count('text')
+    self.counts['char'] += len(str(text))
+
+  def image(self,filename,x,y,w = None,h = None):
+    self.count('image')
+    self.images.add(filename)
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    self.count('template')
+    if key not in self.templates:    # counted once, like a form is written once
+      template = countpage(self.templates)
+      self.templates[key] = template
+      draw(template)
+
+class nulldocument(backend.document):
+  """
+  A document which only counts
+
+  @ivar pages: The saved pages
+  @type pages: C{[countpage]}
+
+  @ivar templates: key -> the template, drawn once
+  @type templates: C{{hashable: countpage}}
+  """
+  def __init__(self):
+    self.pages = []
+    self.templates = {}
+
+  def newpage(self,width,height):
+    return countpage(self.templates)
+
+  def savepage(self,page):
+    self.pages.append(page)
+
+  def close(self):
+    pass
+
+  def counts(self):
+    """
+    Return the number of draw actions of all pages and templates together
+
+    @rtype: C{collections.Counter}
+    """
+    total = collections.Counter()
+    for page in self.pages:
+      total.update(page.counts)
+    for template in self.templates.values():
+      total.update(template.counts)
+    return total
+
+  def pdfsize(self):
+    """
+    Return an estimate of the size of the pdf-file with the pages, in bytes
+
+    @rtype: C{int}
+    """
+    counts = self.counts()
+    size = pdfbytes['file'] + pdfbytes['page'] * len(self.pages) + pdfbytes['form'] * len(self.templates)
+    for kind,count in counts.items():
+      size += pdfbytes.get(kind,0) * count
+    images = set()
+    for page in self.pages:
+      images.update(page.images)
+    for filename in images:
+      if os.path.exists(filename):
+        size += os.path.getsize(filename) * imagefactor
+    return int(size)
@@ -16,6 +16,231 @@
     along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
 
 """
+import os
+import re
+import array
+import pickle
+import hashlib
+import collections
+from xfiglib import backend
+
+# the opcodes of the displaylist
+LINE = 0
+CIRCLE = 1
+TEXT = 2
+IMAGE = 3
+TEMPLATE = 4
+
+class displaylist():
+  """
+  Buffer of draw actions, stored in columns of typed arrays instead of one tuple per action.
+  Strings (texts, fonts and filenames) are stored once in a string table, and referred to by index.
+
+  Meaning of the columns per opcode::
+    LINE    x,y,x2,y2       style  width=dikte  gray
+    CIRCLE  x,y,x2=radius   style  width=dikte  gray
+    TEXT    x,y             style=align  width=fontsize  gray  text  font
+    IMAGE   x,y,x2=w,y2=h (nan when not given)  text=filename
+    TEMPLATE  x,y  text=name of the template
+
+  @ivar ops: The opcode of every action
+  @type ops: C{array.array}
+
+  @ivar strings: The string table
+  @type strings: C{[str]}
+  """
+  def __init__(self):
+    self.ops = array.array('B')
+    self.xs = array.array('d')
+    self.ys = array.array('d')
+    self.x2s = array.array('d')
+    self.y2s = array.array('d')
+    self.styles = array.array('b')
+    self.widths = array.array('d')
+    self.grays = array.array('d')
+    self.texts = array.array('l')
+    self.fonts = array.array('l')
+    self.strings = []
+    self.stringindex = {}
+
+  def __len__(self):
+    return len(self.ops)
+
+  def intern(self,string):
+    """
+    Return the index of the string in the string table, adding it when it is new
+
+    @param string: The string to look up
+    @type  string: C{str}
+
+    @return: Index in self.strings
+    @rtype:  C{int}
+    """
+    index = self.stringindex.get(string)
+    if index is None:
+      index = self.stringindex[string] = len(self.strings)
+      self.strings.append(string)
+    return index
+
+  def append(self,op,x,y,x2=0.0,y2=0.0,style=0,width=0.0,gray=0.0,text=-1,font=-1):
+    """
+    Add one draw action, see the class description for the meaning of the columns
+    """
+    self.ops.append(op)
+    self.xs.append(x)
+    self.ys.append(y)
+    self.x2s.append(x2)
+    self.y2s.append(y2)
+    self.styles.append(style)
+    self.widths.append(width)
+    self.grays.append(gray)
+    self.texts.append(text)
+    self.fonts.append(font)
+
+  def columns(self):
+    """
+    Return all columns, in the order of the append() parameters
+
+    @rtype: C{tuple}
+    """
+    return (self.ops,self.xs,self.ys,self.x2s,self.y2s,self.styles,self.widths,self.grays,self.texts,self.fonts)
+
+  def fingerprint(self,templates=None):
+    """
+    Return a hash of all draw actions, including the drawings of the templates they use
+
+    @param templates: The templates referred to by the TEMPLATE actions
+    @type  templates: C{templatecache}
+
+    @rtype: C{str}
+    """
+    digest = hashlib.sha256()
+    for column in self.columns():
+      digest.update(column.tobytes())
+    digest.update('\0'.join(self.strings).encode('utf-8'))
+    if templates is not None:
+      for op,text in zip(self.ops,self.texts):
+        if op == TEMPLATE:
+          digest.update(templates.fingerprint(self.strings[text]).encode('ascii'))
+    return digest.hexdigest()
+
+  def nbytes(self):
+    """
+    Return the number of bytes used by the columns (not counting the string table)
+
+    @rtype: C{int}
+    """
+    return sum(column.itemsize * len(column) for column in self.columns())
+
+  def rename(self,rename):
+    """
+    Give the templates used by the TEMPLATE actions another name
+
+    @param rename: Function which returns the new name for the name of a template
+    @type  rename: C{callable}
+    """
+    for index,op in enumerate(self.ops):
+      if op == TEMPLATE:
+        self.texts[index] = self.intern(rename(self.strings[self.texts[index]]))
+
+class templatecache():
+  """
+  The templates of one pdf, by key, with a bounded number of entries.
+  When it is full, the least recently used template which is already written to the pdf is forgotten.
+  Templates which are not written yet are always kept, because a buffered page refers to them.
+
+  @ivar maxsize: The maximum number of written templates to remember
+  @type maxsize: C{int}
+
+  @ivar keynames: Make the names from the keys instead of counting, so every process gives
+                  a template the same name (see pdfsheets)
+  @type keynames: C{bool}
+  """
+  def __init__(self,maxsize=64,keynames=False):
+    self.maxsize = maxsize
+    self.keynames = keynames
+    self.names = {}          # key -> name, also of forgotten templates
+    self.entries = collections.OrderedDict()    # key -> name, least recently used first
+    self.templates = {}      # name -> pdfout
+    self.written = set()     # names of the templates written to the pdf
+    self.fingerprints = {}   # name -> fingerprint of the drawing
+
+  def __len__(self):
+    return len(self.entries)
+
+  def lookup(self,key):
+    """
+    Return the name of the template with this key
+
+    @param key: Identification of the template
+    @type  key: C{hashable}
+
+    @return: The name of the template, or None if it is not known
+    @rtype:  C{str}
+    """
+    name = self.entries.get(key)
+    if name is not None:
+      self.entries.move_to_end(key)
+    return name
+
+  def add(self,key,template):
+    """
+    Remember a new template
+
+    @param key: Identification of the template
+    @type  key: C{hashable}
+
+    @param template: The drawing of the template
+    @type  template: C{pdfout}
+
+    @return: The name of the template
+    @rtype:  C{str}
+    """
+    # a template which is forgotten and made again gets the same name, its form is written once
+    name = self.names.get(key)
+    if name is None:
+      if self.keynames:
+        name = "tmpl" + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+      else:
+        name = "tmpl{nr}".format(nr = len(self.names))    # short, it is in the resources of every page
+      self.names[key] = name
+    self.entries[key] = name
+    self.templates[name] = template
+    if len(self.entries) > self.maxsize:
+      for oldkey,oldname in self.entries.items():
+        if oldname in self.written:
+          del self.entries[oldkey]
+          del self.templates[oldname]
+          self.fingerprints.pop(oldname,None)
+          self.written.discard(oldname)
+          break
+    return name
+
+  def fingerprint(self,name):
+    """
+    Return the hash of the drawing of a template
+
+    @param name: The name of the template
+    @type  name: C{str}
+
+    @rtype: C{str}
+    """
+    if name not in self.fingerprints:
+      self.fingerprints[name] = self.templates[name].drawings.fingerprint(self)
+    return self.fingerprints[name]
+
+  def template(self,name):
+    """
+    Return the drawing of a template, and mark it as written to the pdf
+
+    @param name: The name of the template
+    @type  name: C{str}
+
+    @rtype: C{pdfout}
+    """
+    self.written.add(name)
+    return self.templates[name]
+
 class pdfout():
   """
   Create xfig files with coordinates in millimeters
@@ -32,8 +257,8 @@ class pdfout():
   @ivar resolution: Fig units/inch and coordinate system
   @type resolution: C{int}
 
-  @ivar drawing: Buffer for holding the drawing on the paper
-  @type drawing: C{str}
+  @ivar drawings: Buffer for holding the drawing on the paper
+  @type drawings: C{displaylist}
 
   @ivar xorigin: X-offset to draw functions
   @type xorigin: C{int}
@@ -44,15 +269,30 @@ class pdfout():
   @ivar originstack: The stack holding the origins
   @type originstack: C{[(int, int)]}
 
+  @ivar templates: The templates, shared by all pdfout objects of one pdf
+  @type templates: C{templatecache}
+
+  @ivar precision: Coordinates are rounded to a multiple of this (in 1/72"), None for no rounding
+  @type precision: C{float}
+
   """
 
   #  ['Courier', 'Courier-Bold', 'Courier-BoldOblique', 'Courier-Oblique', 'Helvetica', 'Helvetica-Bold', 'Helvetica-BoldOblique', 'Helvetica-Oblique', 'Symbol', 'Times-Bold', 'Times-BoldItalic', 'Times-Italic', 'Times-Roman', 'ZapfDingbats']
 
-  def __init__(self,width,height):
+  def __init__(self,width,height,templates=None,precision=None):
     #self.paperwidth = width
     self.paperheight = height
+    if templates is None:
+      templates = templatecache()
+    self.templates = templates
+    self.precision = precision
     self.resolution = 72	        #Fig units/inch and coordinate system:
-    self.drawings = []
+    self.drawings = displaylist()
+    self.emitted = 0    # number of graphics state operators written by the last save()
+    self.skipped = 0    # number of graphics state operators not needed by the last save()
+    self.merged = 0     # number of lines stroked in the path of the line before, by the last save()
+    self.compacted = 0  # number of bytes removed from the content stream by the last save()
+    self.forms = []     # the templates written as a form by the last save() or reuse()
 
     self.xorigin = 0
     self.yorigin = 0
@@ -115,9 +355,9 @@ class pdfout():
     @param dikte: Thickness of the line in 1/80"
     @type  dikte: C{int}
     """
-    self.drawings.append(('L',self.mm2pos(self.xorigin+fx),self.mm2pos(self.paperheight-(self.yorigin+fy)),
-                          self.mm2pos(self.xorigin+fx+dx),self.mm2pos(self.paperheight-(self.yorigin+fy+dy)),
-                          style,dikte,gray))
+    self.drawings.append(LINE,self.mm2pos(self.xorigin+fx),self.mm2pos(self.paperheight-(self.yorigin+fy)),
+                         self.mm2pos(self.xorigin+fx+dx),self.mm2pos(self.paperheight-(self.yorigin+fy+dy)),
+                         style,dikte,gray)
     # add gray color default to 0
     # for gray in (0.0, 0.25, 0.50, 0.75, 1.0):        canvas.setFillGray(gray)
 
@@ -142,12 +382,17 @@ class pdfout():
     @type  filename: C{str}
 
     """
+    # nan is stored when the size is not given
     if w != None:
       w = self.mm2pos(w)
+    else:
+      w = float('nan')
     if h != None:
       h = self.mm2pos(h)
-    self.drawings.append(('I',self.mm2pos(self.xorigin+x),self.mm2pos(self.paperheight-(self.yorigin+y)),
-                          w,h,filename))
+    else:
+      h = float('nan')
+    self.drawings.append(IMAGE,self.mm2pos(self.xorigin+x),self.mm2pos(self.paperheight-(self.yorigin+y)),
+                         w,h,text=self.drawings.intern(filename))
      
   def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
     """
@@ -172,7 +417,8 @@ class pdfout():
     @param align: Align the tekst left(0),centre(1) or right(2)
     @type  align: C{int}
     """
-    self.drawings.append(('T',self.mm2pos(self.xorigin+x), self.mm2pos(self.paperheight-(self.yorigin+y)), text,font,fsize,align,gray))
+    self.drawings.append(TEXT,self.mm2pos(self.xorigin+x), self.mm2pos(self.paperheight-(self.yorigin+y)),
+                         style=align,width=fsize,gray=gray,text=self.drawings.intern(text),font=self.drawings.intern(font))
 
   def circle(self,x,y,rad,style=0,dikte=1,gray=0):
     """
@@ -193,7 +439,33 @@ class pdfout():
     @param dikte: Thickness of the circle in 1/72"
     @type  dikte: C{int}
     """
-    self.drawings.append(('C',self.mm2pos(self.xorigin+x), self.mm2pos(self.paperheight-(self.yorigin+y)),self.mm2pos(rad),style,dikte,gray))
+    self.drawings.append(CIRCLE,self.mm2pos(self.xorigin+x), self.mm2pos(self.paperheight-(self.yorigin+y)),self.mm2pos(rad),0.0,style,dikte,gray)
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    """
+    Draw a template on (x,y), relative to origin. A template is drawn only once in the pdf
+    (as a form XObject), and every placement refers to it.
+
+    @param key: Identification of the template, equal keys give the same drawing
+    @type  key: C{hashable}
+
+    @param draw: Function which draws the template, when it is not known yet.
+                 It is called with a pdfout object, on which (0,0) is (x,y)
+    @type  draw: C{callable}
+
+    @param x: X point of the origin of the template
+    @type  x: C{int}
+
+    @param y: Y point of the origin of the template
+    @type  y: C{int}
+    """
+    name = self.templates.lookup(key)
+    if name is None:
+      template = pdfout(0,0,self.templates,self.precision)   # paperheight 0, so (0,0) is the origin of the form
+      draw(template)
+      name = self.templates.add(key,template)
+    self.drawings.append(TEMPLATE,self.mm2pos(self.xorigin+x),self.mm2pos(self.paperheight-(self.yorigin+y)),
+                         text=self.drawings.intern(name))
 
   def mm2pos(self,mm):
     """
@@ -206,47 +478,607 @@ class pdfout():
     @return: The number of fig units for the given distance
     @rtype:  C{int}
     """
+    if self.precision:    # less digits in the pdf, the rest is too small to see
+      return round(mm*self.resolution/25.4/self.precision)*self.precision
     return mm*self.resolution/25.4
 
   def save(self,pdf):
     """
-    Write the drawing to a file
+    Write the drawing to a page of the pdf
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+    """
+    self.replay(pdf)
+    self.drawings = displaylist()
+    pdf.showPage()
+
+  def fingerprint(self):
+    """
+    Return a hash of the drawing, equal drawings give the same page in the pdf
+
+    @rtype: C{str}
+    """
+    return self.drawings.fingerprint(self.templates)
 
-    @param filename: The complete filename to which the drawing has to be written
+  def render(self,pdf):
+    """
+    Draw the drawing on the current page of the pdf, without finishing the page, and return
+    what is needed to put the same page in another pdf with reuse()
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+
+    @return: The content stream, the pdf names of the fonts and the forms used,
+             or None when the page cannot be reused (it has images)
+    @rtype:  C{([str], {str: str}, [str])}
+    """
+    self.replay(pdf)
+    record = None
+    if IMAGE not in self.drawings.ops:
+      fonts = dict((font,pdf._doc.getInternalFontName(font)) for font in self.fonts)
+      record = (list(pdf._code),fonts,list(pdf._formsinuse))
+    self.drawings = displaylist()
+    return record
+
+  def reuse(self,pdf,record):
+    """
+    Put a page made by render() on the current page of the pdf, instead of drawing it again.
+    The drawing must have the same fingerprint as the one that was rendered.
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+
+    @param record: The result of render()
+    @type  record: C{([str], {str: str}, [str])}
+
+    @return: False when the page cannot be reused in this pdf (fonts have other names, or templates are unknown)
+    @rtype:  C{bool}
+    """
+    code,fonts,forms = record
+    for font,name in fonts.items():
+      if pdf._doc.getInternalFontName(font) != name:
+        return False
+    for name in forms:
+      if not pdf.hasForm(name) and name not in self.templates.templates:
+        return False
+    self.forms = []
+    for name in forms:
+      if not pdf.hasForm(name):
+        template = self.templates.template(name)
+        template.saveform(pdf,name)
+        self.forms.append(template)
+    pdf._code.extend(code)
+    pdf._formsinuse.extend(forms)
+    self.drawings = displaylist()
+    self.emitted = 0
+    self.skipped = 0
+    self.merged = 0
+    self.compacted = 0
+    return True
+
+  def counts(self):
+    """
+    Return the counters of the last save() or reuse(), with those of the forms it wrote
+
+    @return: The graphics state operators emitted and skipped, the lines merged and the bytes compacted
+    @rtype:  C{(int, int, int, int)}
+    """
+    counts = (self.emitted,self.skipped,self.merged,self.compacted)
+    for template in self.forms:
+      counts = tuple(count + formcount for count,formcount in zip(counts,template.counts()))
+    return counts
+
+  def saveform(self,pdf,name):
+    """
+    Write the drawing as a form XObject to the pdf, (0,0) of the drawing is (0,0) of the form
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+
+    @param name: The name of the form
+    @type  name: C{str}
+    """
+    (width,height) = pdf._pagesize
+    pdf.beginForm(name,-width,-height,width,height)   # the template can be placed anywhere on the page
+    self.replay(pdf)
+    pdf.endForm()
+
+  def placeform(self,pdf,name,x,y):
+    """
+    Draw a template on the pdf, and write it out the first time it is used
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+
+    @param name: The name of the template
+    @type  name: C{str}
+
+    @param x: X position in 1/72"
+    @type  x: C{float}
+
+    @param y: Y position in 1/72"
+    @type  y: C{float}
+    """
+    template = self.templates.template(name)
+    if not pdf.hasForm(name):    # also when it was forgotten and made again, the name is the same
+      template.saveform(pdf,name)
+      self.forms.append(template)
+    pdf.saveState()
+    pdf.translate(x,y)
+    pdf.doForm(name)
+    pdf.restoreState()
+
+  def replay(self,pdf):
+    """
+    Draw all buffered actions on the canvas.
+    Consecutive lines with the same style, width and gray are drawn as one path, with one stroke.
+
+    @param pdf: The reportlab canvas to draw on
+    @type  pdf: C{reportlab.pdfgen.canvas.Canvas}
+    """
+    state = pdfstate(pdf)
+    self.forms = []
+    strings = self.drawings.strings
+    lines = []          # the lines of the path, not stroked yet
+    linestyle = None    # (style,width,gray) of the path
+    merged = 0
+    for op,x,y,x2,y2,style,width,gray,text,font in zip(*self.drawings.columns()):
+      if op == LINE:
+        if lines and (style,width,gray) == linestyle:
+          lines.append((x,y,x2,y2))
+          merged += 1
+          continue
+        if lines:
+          pdf.lines(lines)
+        # the state can not be changed inside a path, so only before the first line
+        state.setlinewidth(width)
+        state.setstrokegray(gray)
+        state.setdash(style)
+        lines = [(x,y,x2,y2)]
+        linestyle = (style,width,gray)
+        continue
+      if lines:
+        pdf.lines(lines)
+        lines = []
+      if op == CIRCLE:
+        state.setlinewidth(width)
+        state.setstrokegray(gray)
+        state.setdash(style)
+        pdf.circle(x,y,x2)
+      elif op == TEXT:
+        state.setfont(strings[font],width)
+        state.setstrokegray(gray)
+        if style == 0:    # left align
+          pdf.drawString(x,y,strings[text])
+        elif style == 1:   # centre
+          pdf.drawCentredString(x,y,strings[text])
+        else: #style == 2:
+          pdf.drawRightString(x,y,strings[text])
+      elif op == TEMPLATE:
+        self.placeform(pdf,strings[text],x,y)
+      elif op == IMAGE:
+        # nan != nan, for the sizes which were not given
+        pdf.drawImage(strings[text],x,y,x2 if x2 == x2 else None,y2 if y2 == y2 else None)
+      else:
+        raise ValueError("unknown command " + repr(op))
+    if lines:
+      pdf.lines(lines)
+    size = len('\n'.join(pdf._code))
+    pdf._code[:] = compact(pdf._code)
+    self.compacted = size - len('\n'.join(pdf._code))
+    self.merged = merged
+    self.emitted = state.emitted
+    self.skipped = state.skipped
+    self.fonts = state.fonts
+
+fontoperator = re.compile(r'BT (/\S+ \S+ Tf) \S+ TL ET$')                # setFont()
+formoperator = re.compile(r'(/FormXob\.)(\S+)( Do)')                     # doForm()
+textoperators = re.compile(r'BT (1 0 0 1 \S+ \S+ Tm .*) T\* ET$',re.S)    # drawString() and friends
+
+def compact(code):
+  """
+  Return a content stream without the operators which do not change the drawing:
+  consecutive text objects are merged into one, fonts which are set and not used
+  are left out, as are the line feeds (T*) after texts with the leading (TL) for them,
+  the identity transformation and the 'n' before a new path.
+  Every text of pdfout starts with an absolute text matrix (Tm), so merging keeps their positions.
+
+  @param code: The operators, as in the _code of a reportlab canvas
+  @type  code: C{[str]}
+
+  @rtype: C{[str]}
+  """
+  result = []
+  text = []           # the operators of the merged text object
+  fontlast = False    # the last operator in text sets the font
+  for entry in code:
+    match = fontoperator.match(entry)
+    if match:
+      if fontlast:
+        text[-1] = match.group(1)   # the font before is not used by any text
+      else:
+        text.append(match.group(1))
+      fontlast = True
+      continue
+    match = textoperators.match(entry)
+    if match:
+      text.append(match.group(1))
+      fontlast = False
+      continue
+    if text:
+      result.append('BT ' + ' '.join(text) + ' ET')
+      text = []
+      fontlast = False
+    if entry == 'n' or entry == '1 0 0 1 0 0 cm':    # there is no path yet, and the identity
+      continue
+    if entry.startswith('n '):
+      entry = entry[2:]
+    result.append(entry)
+  if text:
+    result.append('BT ' + ' '.join(text) + ' ET')
+  return result
+
+class pagestore():
+  """
+  The rendered pages of the previous run, by fingerprint of their drawing, kept in a file.
+  Only the pages of the last run are kept.
+
+  @ivar filename: The file with the pages
+  @type filename: C{str}
+
+  @ivar reused: Number of pages taken from the previous run
+  @type reused: C{int}
+
+  @ivar rendered: Number of pages drawn again
+  @type rendered: C{int}
+  """
+  def __init__(self,filename):
+    self.filename = filename
+    self.previous = {}
+    if os.path.exists(filename):
+      try:
+        with open(filename,'rb') as f:
+          self.previous = pickle.load(f)
+      except (OSError,pickle.UnpicklingError,EOFError):     # damaged, start again
+        self.previous = {}
+    self.current = {}
+    self.reused = 0
+    self.rendered = 0
+
+  def get(self,fingerprint):
+    """
+    Return the page of the previous run with this fingerprint, or None
+    """
+    return self.previous.get(fingerprint)
+
+  def put(self,fingerprint,record):
+    """
+    Remember a page of this run
+
+    @param record: The result of pdfout.render(), None when it cannot be reused
+    """
+    if record is not None:
+      self.current[fingerprint] = record
+
+  def save(self):
+    """
+    Write the pages of this run to the file
+    """
+    with open(self.filename + '.tmp','wb') as f:
+      pickle.dump(self.current,f,pickle.HIGHEST_PROTOCOL)
+    os.replace(self.filename + '.tmp',self.filename)
+
+class pdfdocument(backend.document):
+  """
+  A pdf-file, with pdfout objects as pages
+
+  @ivar canvas: The reportlab canvas of the pdf
+  @type canvas: C{reportlab.pdfgen.canvas.Canvas}
+
+  @ivar templates: The templates of the pdf, shared by all pages
+  @type templates: C{templatecache}
+
+  @ivar pages: The pages of the previous run, or None
+  @type pages: C{pagestore}
+
+  @ivar emitted: Number of graphics state operators written to every page drawn
+  @type emitted: C{[int]}
+
+  @ivar skipped: Number of graphics state operators which were not needed on every page drawn
+  @type skipped: C{[int]}
+
+  @ivar merged: Number of lines stroked in one path with the line before, strokes not needed, on every page drawn
+  @type merged: C{[int]}
+
+  @ivar compacted: Number of bytes removed from the content stream of every page drawn
+  @type compacted: C{[int]}
+  """
+  def __init__(self,filename,pagesize,reproducible=False,pages=None,fonts=(),precision=None):
+    """
+    @param filename: The name of the pdf-file, or a binary stream (eg io.BytesIO) which gets the pdf when it is closed
     @type  filename: C{str}
+
+    @param pagesize: The size of the paper (width,height) in 1/72"
+    @type  pagesize: C{(float, float)}
+
+    @param reproducible: Use a fixed creation date and document ID, so the same drawing gives the same file
+    @type  reproducible: C{bool}
+
+    @param pages: The pages of a previous run, pages with the same drawing are not drawn again
+    @type  pages: C{pagestore}
+
+    @param fonts: Fonts to give a name in the pdf first, in this order, so pages made by pdfsheets
+                  with the same fonts can be added
+    @type  fonts: C{[str]}
+
+    @param precision: Coordinates are rounded to a multiple of this (in 1/72", eg 0.01), None for no rounding
+    @type  precision: C{float}
     """
-    for cmd in self.drawings:
-      if cmd[0] == 'L':
-        # line x,y,x2,y2,style,dikte,gray=0
-        pdf.setLineWidth(cmd[6])
-        pdf.setStrokeGray(cmd[7])
-        if cmd[5] == 0:   # solid
-          pdf.setDash()
-        else:    # 2 == dashed
-          pdf.setDash(1,2)
-          #canvas.setDash(self, array=[], phase=0) 
-        pdf.line(cmd[1],cmd[2],cmd[3],cmd[4])
-      elif cmd[0] == 'C':   # circle(self,x,y,rad,style=0,dikte=1,gray=0):
-        pdf.setLineWidth(cmd[5])
-        pdf.setStrokeGray(cmd[6])
-        if cmd[4] == 0:   # solid
-          pdf.setDash()
-        else:    # 2 == dashed
-          pdf.setDash(1,2)
-        pdf.circle(cmd[1],cmd[2],cmd[3])
-      elif cmd[0] == 'T':   # tekst(self,x,y,text,font=0,fsize=12,align=0,gray=0):
-        #print(cmd[4],cmd[5])
-        pdf.setFont(cmd[4],cmd[5])
-        pdf.setStrokeGray(cmd[7])
-        if cmd[6] == 0:    # left align
-          pdf.drawString(cmd[1],cmd[2], cmd[3])
-        elif cmd[6] == 1:   # centre
-          pdf.drawCentredString(cmd[1],cmd[2], cmd[3])
-        else: #cmd[6] == 2:
-          pdf.drawRightString( cmd[1],cmd[2], cmd[3])
-      elif cmd[0] == 'I':   # image(self,filename,x,y,w = None,h = None)
-        pdf.drawImage(cmd[5],cmd[1],cmd[2],cmd[3],cmd[4])
+    from reportlab.pdfgen import canvas    # imported here, so the drawing can be buffered without reportlab
+    self.canvas = canvas.Canvas(filename,pageCompression=1,verbosity=0,invariant=int(reproducible))    #,pagesize=A4,bottumup = 0,pageCompression=0,
+    self.canvas.setPageSize(pagesize)
+    for font in fonts:
+      self.canvas._doc.getInternalFontName(font)
+    self.templates = templatecache()
+    self.sheettemplates = {}    # name -> drawing of the templates of pdfsheets, see addtemplates()
+    self.renamed = {}           # name of a template of pdfsheets -> name in this pdf
+    self.pages = pages
+    self.precision = precision
+    self.emitted = []
+    self.skipped = []
+    self.merged = []
+    self.compacted = []
+
+  def setinfo(self,author,creator,title,subject):
+    self.canvas.setAuthor(author)
+    self.canvas.setCreator(creator)
+    self.canvas.setTitle(title)
+    self.canvas.setSubject(subject)
+
+  def newpage(self,width,height):
+    return pdfout(width,height,self.templates,self.precision)
+
+  def savepage(self,page):
+    if self.pages is None:
+      page.save(self.canvas)
+    else:
+      fingerprint = page.fingerprint()
+      record = self.pages.get(fingerprint)
+      if record is not None and page.reuse(self.canvas,record):
+        self.pages.reused += 1
       else:
-        error("unknown command")
-    self.drawings=[]
-    pdf.showPage()
+        record = page.render(self.canvas)
+        self.pages.rendered += 1
+      self.pages.put(fingerprint,record)
+      self.canvas.showPage()
+    self.count(*page.counts())
+
+  def count(self,emitted,skipped,merged,compacted):
+    """
+    Remember the counters of a page, see pdfout.counts()
+    """
+    self.emitted.append(emitted)
+    self.skipped.append(skipped)
+    self.merged.append(merged)
+    self.compacted.append(compacted)
+
+  def close(self):
+    self.canvas.save()
+    if self.pages is not None:
+      self.pages.save()
+
+  def addtemplates(self,templates):
+    """
+    Add the templates of pages made by pdfsheets, they get a name in this pdf when a page uses them
+
+    @param templates: name -> drawing of the template
+    @type  templates: C{{str: displaylist}}
+    """
+    for name,drawings in templates.items():
+      self.sheettemplates.setdefault(name,drawings)
+
+  def sheettemplate(self,name):
+    """
+    Return the name in this pdf of a template made by pdfsheets, a short name counted
+    in the order the pages use the templates
+
+    @param name: The name of the template in pdfsheets
+    @type  name: C{str}
+
+    @rtype: C{str}
+    """
+    if name not in self.renamed:
+      template = pdfout(0,0,self.templates)
+      template.drawings = self.sheettemplates[name]
+      template.drawings.rename(self.sheettemplate)    # the templates in the template are made first
+      self.renamed[name] = self.templates.add(name,template)
+    return self.renamed[name]
+
+  def addpage(self,record,drawings,counts):
+    """
+    Add a page made by pdfsheets, after the templates it uses are added
+
+    @param record: The page as made by pdfout.render(), or None
+    @type  record: C{([str], {str: str}, [str])}
+
+    @param drawings: The drawing of the page, when there is no record
+    @type  drawings: C{displaylist}
+
+    @param counts: The counters of the page when it was rendered, without its forms, see pdfout.counts()
+    @type  counts: C{(int, int, int, int)}
+    """
+    page = pdfout(0,0,self.templates)
+    if record is None:
+      drawings.rename(self.sheettemplate)
+      page.drawings = drawings
+      page.save(self.canvas)
+      self.count(*page.counts())
+      return
+    code,fonts,forms = record
+    names = dict((name,self.sheettemplate(name)) for name in forms)
+    rename = lambda match: match.group(1) + names.get(match.group(2),match.group(2)) + match.group(3)
+    record = ([formoperator.sub(rename,line) for line in code],fonts,[names[name] for name in forms])
+    if not page.reuse(self.canvas,record):
+      raise RuntimeError("the fonts of the page have other names in this pdf")
+    self.canvas.showPage()
+    # the forms are written here, not by pdfsheets, so every form is counted once
+    self.count(*[count + formcount for count,formcount in zip(counts,page.counts())])
+
+class pdfsheets(backend.document):
+  """
+  Draw only some of the sheets of a document, and keep their pages as content streams,
+  to be put in one pdf with pdfdocument.addtemplates() and addpage(). With more processes,
+  each with its own share of the sheets, the pages are drawn in parallel.
+  A sheet is two pages (both sides of the paper), made one after the other.
+  The templates are named after their keys, the same in every process, and get a short name in the pdf.
+
+  @ivar pages: (number of the page in the document, record of render() or None, displaylist when there is no record,
+               the counters of the page without its forms, see pdfdocument.addpage())
+  @type pages: C{[(int, tuple, displaylist, tuple)]}
+
+  @ivar drawings: name -> drawing of the templates used by the pages
+  @type drawings: C{{str: displaylist}}
+  """
+  def __init__(self,pagesize,parts,part,fonts=(),precision=None):
+    """
+    @param pagesize: The size of the paper (width,height) in 1/72"
+    @type  pagesize: C{(float, float)}
+
+    @param parts: The number of parts the sheets are divided in
+    @type  parts: C{int}
+
+    @param part: Which part to draw, the sheets with number % parts == part
+    @type  part: C{int}
+
+    @param fonts: Fonts to give a name first, the same as for the pdfdocument
+    @type  fonts: C{[str]}
+
+    @param precision: Coordinates are rounded to a multiple of this, see pdfdocument
+    @type  precision: C{float}
+    """
+    from io import BytesIO
+    from reportlab.pdfgen import canvas
+    # the canvas is never saved, it gives the content streams and the names of fonts and templates
+    self.canvas = canvas.Canvas(BytesIO(),pageCompression=0,verbosity=0,invariant=1)
+    self.canvas.setPageSize(pagesize)
+    for font in fonts:
+      self.canvas._doc.getInternalFontName(font)
+    self.templates = templatecache(keynames=True)
+    self.precision = precision
+    self.parts = parts
+    self.part = part
+    self.created = 0
+    self.saved = 0
+    self.pages = []
+    self.drawings = {}
+
+  def newpage(self,width,height):
+    sheet = self.created // 2
+    self.created += 1
+    if sheet % self.parts != self.part:
+      return backend.nullpage()
+    return pdfout(width,height,self.templates,self.precision)
+
+  def savepage(self,page):
+    number = self.saved
+    self.saved += 1
+    if isinstance(page,backend.nullpage):
+      return
+    drawings = page.drawings
+    record = page.render(self.canvas)
+    self.canvas.showPage()
+    if record is not None:
+      drawings = None
+    self.pages.append((number,record,drawings,(page.emitted,page.skipped,page.merged,page.compacted)))
+    for name in self.templates.written:     # before they can be forgotten
+      if name not in self.drawings:
+        self.drawings[name] = self.templates.templates[name].drawings
+
+  def close(self):
+    pass
+
+class pdfstate():
+  """
+  Remember the graphics state of a reportlab canvas, and only change it when it is different.
+  A new page (showPage) starts with an unknown state.
+
+  @ivar emitted: Number of state operators written to the canvas
+  @type emitted: C{int}
+
+  @ivar skipped: Number of state operators not written, because the state was already right
+  @type skipped: C{int}
+  """
+  def __init__(self,pdf):
+    self.pdf = pdf
+    self.linewidth = None
+    self.strokegray = None
+    self.dash = None
+    self.font = None
+    self.fonts = set()     # all fonts which are used
+    self.emitted = 0
+    self.skipped = 0
+
+  def setlinewidth(self,width):
+    """
+    Set the width of the lines
+
+    @param width: Thickness of the line in 1/72"
+    @type  width: C{float}
+    """
+    if width == self.linewidth:
+      self.skipped += 1
+      return
+    self.linewidth = width
+    self.emitted += 1
+    self.pdf.setLineWidth(width)
+
+  def setstrokegray(self,gray):
+    """
+    Set the gray of the lines
+
+    @param gray: 0 is black, 1 is white
+    @type  gray: C{float}
+    """
+    if gray == self.strokegray:
+      self.skipped += 1
+      return
+    self.strokegray = gray
+    self.emitted += 1
+    self.pdf.setStrokeGray(gray)
+
+  def setdash(self,style):
+    """
+    Set the style of the lines
+
+    @param style: The style of the line 0=SOLID, 2=dashed
+    @type  style: C{int}
+    """
+    if style == self.dash:
+      self.skipped += 1
+      return
+    self.dash = style
+    self.emitted += 1
+    if style == 0:   # solid
+      self.pdf.setDash()
+    else:    # 2 == dashed
+      self.pdf.setDash(1,2)
+      #canvas.setDash(self, array=[], phase=0) 
+
+  def setfont(self,font,fsize):
+    """
+    Set the font for the text
+
+    @param font: Name of the font
+    @type  font: C{str}
+
+    @param fsize: The size of the font in 1/72"
+    @type  fsize: C{int}
+    """
+    if (font,fsize) == self.font:
+      self.skipped += 1
+      return
+    self.font = (font,fsize)
+    self.fonts.add(font)
+    self.emitted += 1
+    self.pdf.setFont(font,fsize)
@@ -0,0 +1,290 @@
+""" Copyright (C) 2014 T.Hofkamp
+
+    This file is part of FilofaxDIY.
+
+    FilofaxDIY is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    FilofaxDIY is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+from xml.sax.saxutils import escape, quoteattr
+from xfiglib import backend
+
+def num(value):
+  """
+  Format a number for svg, with at most 3 decimals and without trailing zeros
+
+  @param value: The number
+  @type  value: C{float}
+
+  @rtype: C{str}
+  """
+  text = "{0:.3f}".format(value).rstrip('0').rstrip('.')
+  if text == '-0':
+    return '0'
+  return text
+
+def pt2mm(pt):
+  """
+  Calculate 1/72" to mm
+
+  @param pt: distance in 1/72"
+  @type  pt: C{float}
+
+  @rtype: C{float}
+  """
+  return pt * 25.4 / 72
+
+class svgout():
+  """
+  Create svg drawings with coordinates in millimeters, with the drawing functions of pdfout.
+  The svg elements are buffered until the page is written by svgdocument.
+
+  @ivar elements: The svg elements of the drawing
+  @type elements: C{[str]}
+
+  @ivar symbols: The templates of the document, by key: (id, svg elements, ids of the symbols it uses)
+  @type symbols: C{{object: (str, str, [str])}}
+
+  @ivar used: The ids of the symbols used on this drawing, in order of first use
+  @type used: C{[str]}
+
+  @ivar xorigin: X-offset to draw functions
+  @type xorigin: C{float}
+
+  @ivar yorigin: Y-offset to draw functions
+  @type yorigin: C{float}
+
+  @ivar originstack: The stack holding the origins
+  @type originstack: C{[(float, float)]}
+  """
+  def __init__(self,width,height,symbols=None):
+    self.paperwidth = width
+    self.paperheight = height
+    if symbols is None:
+      symbols = {}
+    self.symbols = symbols
+    self.elements = []
+    self.used = []
+
+    self.xorigin = 0
+    self.yorigin = 0
+    self.originstack = []
+
+  def pushorigin(self,dx,dy):
+    """
+    Push the current origin to the stack, and move it relative to (dx,dy)
+
+    @param dx: Delta x to move the origin to
+    @type  dx: C{float}
+
+    @param dy: Delta y to move the origin to
+    @type  dy: C{float}
+    """
+    self.originstack.append((self.xorigin,self.yorigin))
+    self.xorigin += dx
+    self.yorigin += dy
+
+  def poporigin(self):
+    """
+    Return to the previous origin
+    """
+    (self.xorigin,self.yorigin) = self.originstack.pop()
+
+  def setorigin(self,x,y):
+    """
+    Set the current origin, clearing the stack
+
+    @param x: x to move the origin to
+    @type  x: C{float}
+
+    @param y: y to move the origin to
+    @type  y: C{float}
+    """
+    self.originstack = []
+    self.xorigin = x
+    self.yorigin = y
+
+  def stroke(self,style,dikte,gray):
+    """
+    Return the svg attributes of a line
+
+    @param style: The style of the line 0=SOLID, other is dashed
+    @type  style: C{int}
+
+    @param dikte: Thickness of the line in 1/72"
+    @type  dikte: C{float}
+
+    @param gray: 0 is black, 1 is white
+    @type  gray: C{float}
+
+    @rtype: C{str}
+    """
+    attributes = 'stroke-width="{width}"'.format(width = num(pt2mm(dikte)))
+    if gray != 0:
+      attributes += ' stroke="{color}"'.format(color = self.color(gray))
+    if style != 0:
+      attributes += ' stroke-dasharray="{on},{off}"'.format(on = num(pt2mm(1)),off = num(pt2mm(2)))
+    return attributes
+
+  def color(self,gray):
+    """
+    Return the svg color of a gray
+
+    @param gray: 0 is black, 1 is white
+    @type  gray: C{float}
+
+    @rtype: C{str}
+    """
+    level = int(round(gray * 255))
+    return "#{0:02x}{0:02x}{0:02x}".format(level)
+
+  def line(self,fx,fy,dx,dy,style=0,dikte=1,gray=0):
+    """
+    Draw a line from (fx,fy) to (fx+dx,fy+dy), relative to origin
+
+    @param style: The style of the line 0=SOLID
+    @type  style: C{int}
+
+    @param dikte: Thickness of the line in 1/72"
+    @type  dikte: C{float}
+    """
+    x = self.xorigin + fx
+    y = self.yorigin + fy
+    self.elements.append('<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" {stroke}/>'.format(
+      x1 = num(x),y1 = num(y),x2 = num(x + dx),y2 = num(y + dy),stroke = self.stroke(style,dikte,gray)))
+
+  def circle(self,x,y,rad,style=0,dikte=1,gray=0):
+    """
+    Draw a circle on centre (x,y) with the given radius, relative to origin
+
+    @param style: The style of the circle 0=SOLID
+    @type  style: C{int}
+
+    @param dikte: Thickness of the circle in 1/72"
+    @type  dikte: C{float}
+    """
+    self.elements.append('<circle cx="{x}" cy="{y}" r="{r}" {stroke}/>'.format(
+      x = num(self.xorigin + x),y = num(self.yorigin + y),r = num(rad),stroke = self.stroke(style,dikte,gray)))
+
+  def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
+    """
+    Write some tekst, relative to origin
+
+    @param y: Y of lower point of tekst
+    @type  y: C{float}
+
+    @param font: The PostScript name of the font
+    @type  font: C{str}
+
+    @param fsize: The size of the font in 1/72"
+    @type  fsize: C{int}
+
+    @param align: Align the tekst left(0),centre(1) or right(2)
+    @type  align: C{int}
+    """
+    family = font.split('-')[0]
+    attributes = 'font-family={family} font-size="{size}"'.format(family = quoteattr(family),size = num(pt2mm(fsize)))
+    if 'Bold' in font:
+      attributes += ' font-weight="bold"'
+    if 'Oblique' in font or 'Italic' in font:
+      attributes += ' font-style="italic"'
+    if align == 1:
+      attributes += ' text-anchor="middle"'
+    elif align == 2:
+      attributes += ' text-anchor="end"'
+    # text is filled, and not stroked
+    attributes += ' fill="{color}" stroke="none"'.format(color = self.color(gray))
+    self.elements.append('<text x="{x}" y="{y}" {attributes}>{text}</text>'.format(
+      x = num(self.xorigin + x),y = num(self.yorigin + y),attributes = attributes,text = escape(text)))
+
+  def image(self,filename,x,y,w = None,h = None):
+    """
+    Draw a image with the lower left corner on (x,y), with the size (w,h)
+
+    @param filename: The name of the file, it is referred to, not included
+    @type  filename: C{str}
+    """
+    self.elements.append('<image x="{x}" y="{y}" width="{w}" height="{h}" xlink:href={href}/>'.format(
+      x = num(self.xorigin + x),y = num(self.yorigin + y - h),w = num(w),h = num(h),href = quoteattr(filename)))
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    """
+    Draw a template on (x,y), relative to origin. The template is a <symbol>, written once
+    in every file which uses it, and every placement is a <use>.
+
+    @param key: Identification of the template, equal keys give the same drawing
+    @type  key: C{hashable}
+
+    @param draw: Function which draws the template, when it is not known yet.
+                 It is called with a svgout object, on which (0,0) is (x,y)
+    @type  draw: C{callable}
+    """
+    if key not in self.symbols:
+      template = svgout(0,0,self.symbols)
+      draw(template)
+      self.symbols[key] = ("s{nr}".format(nr = len(self.symbols)),"\n".join(template.elements),template.used)
+    symbolid,body,nested = self.symbols[key]
+    for used in nested + [symbolid]:    # the symbols used in the symbol are needed too
+      if used not in self.used:
+        self.used.append(used)
+    self.elements.append('<use xlink:href="#{id}" x="{x}" y="{y}"/>'.format(id = symbolid,x = num(self.xorigin + x),y = num(self.yorigin + y)))
+
+  def save(self,f):
+    """
+    Write the drawing as a complete svg file
+
+    @param f: The open file
+    @type  f: C{file}
+    """
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'width="{w}mm" height="{h}mm" viewBox="0 0 {w} {h}">\n'.format(w = num(self.paperwidth),h = num(self.paperheight)))
+    if self.used:
+      bodies = dict((symbolid,body) for symbolid,body,nested in self.symbols.values())
+      f.write('<defs>\n')
+      for symbolid in self.used:
+        f.write('<symbol id="{id}" overflow="visible">\n{body}\n</symbol>\n'.format(id = symbolid,body = bodies[symbolid]))
+      f.write('</defs>\n')
+    f.write('<g fill="none" stroke="black">\n')
+    for element in self.elements:
+      f.write(element)
+      f.write('\n')
+    f.write('</g>\n</svg>\n')
+    self.elements = []
+
+class svgdocument(backend.document):
+  """
+  Write every page to its own svg-file, named basename_0000.svg, basename_0001.svg and so on.
+  A file is written when its page is saved.
+
+  @ivar basename: The start of the filenames
+  @type basename: C{str}
+
+  @ivar symbols: The templates, shared by all pages
+  @type symbols: C{{object: (str, str, [str])}}
+  """
+  def __init__(self,basename):
+    self.basename = basename
+    self.symbols = {}
+    self.pagecount = 0
+
+  def newpage(self,width,height):
+    return svgout(width,height,self.symbols)
+
+  def savepage(self,page):
+    with open("{base}_{nr:04d}.svg".format(base = self.basename,nr = self.pagecount),'w',encoding='utf-8') as f:
+      page.save(f)
+    self.pagecount += 1
+
+  def close(self):
+    pass
@@ -16,6 +16,8 @@
     along with FilofaxDIY.  If not, see <http://www.gnu.org/licenses/>.
 
 """
+from xfiglib import backend
+
 class xfig():
   """
   Create xfig files with coordinates in millimeters
@@ -51,8 +53,11 @@ class xfig():
   @ivar coord_system: The place of origin 1=lower left (NOT USED), 2=upper left
   @type coord_system: C{int}
 
-  @ivar drawing: Buffer for holding the drawing on the paper
-  @type drawing: C{str}
+  @ivar drawing: Buffer for holding the lines of the drawing on the paper
+  @type drawing: C{[str]}
+
+  @ivar stream: The open file to which the drawing is written directly, see open()
+  @type stream: C{file}
 
   @ivar depth: Layer on which to draw
   @type depth: C{int}
@@ -122,7 +127,8 @@ class xfig():
     self.resolution = 1200	        #Fig units/inch and coordinate system:
     self.coord_system=2 		#  1: origin at lower left corner (NOT USED)
 					#   2: upper left)
-    self.drawing = ""
+    self.drawing = []
+    self.stream = None                  # when set, lines are written directly instead of buffered
 
     self.depth = 50                     # the depth/layer to draw on
 
@@ -380,6 +386,54 @@ class xfig():
                        x2 = self.mm2pos(self.xorigin+fx+w), y2 = self.mm2pos(self.yorigin+fy+h))
     self.writeline(line)
 
+  def picture(self,filename,fx,fy,w,h):
+    """
+    Draw a picture (eg jpg or png) from (fx,fy) to (fx+w,fy+h)
+    Coordinates are relative to self.origin
+
+    @param filename: The name of the file of the picture
+    @type  filename: C{str}
+
+    @param fx: From this X point
+    @type  fx: C{int}
+
+    @param fy: From this Y point
+    @type  fy: C{int}
+
+    @param w: The width of the picture
+    @type  w: C{int}
+
+    @param h: h The height of the picture
+    @type  h: C{int}
+    """
+    self.writeline("2 5 0 1 0 -1 "+str(self.depth)+" -1 -1 0.000 0 0 -1 0 0 5")
+    self.writeline("\t0 "+filename)
+    line = "\t{x1} {y1} {x2} {y1} {x2} {y2} {x1} {y2} {x1} {y1}"
+    line = line.format(x1 = self.mm2pos(self.xorigin+fx), y1 = self.mm2pos(self.yorigin+fy),
+                       x2 = self.mm2pos(self.xorigin+fx+w), y2 = self.mm2pos(self.yorigin+fy+h))
+    self.writeline(line)
+
+  def placetemplate(self,key,draw,x=0,y=0):
+    """
+    Draw a template on (x,y), relative to origin. xfig has no templates, so it is drawn every time.
+
+    @param key: Identification of the template (not used)
+    @type  key: C{hashable}
+
+    @param draw: Function which draws the template, it is called with this object,
+                 on which (0,0) is (x,y)
+    @type  draw: C{callable}
+
+    @param x: X point of the origin of the template
+    @type  x: C{int}
+
+    @param y: Y point of the origin of the template
+    @type  y: C{int}
+    """
+    self.pushorigin(x,y)
+    draw(self)
+    self.poporigin()
+
   def mm2pos(self,mm):
     """
     Calculate mm to xfig units
@@ -402,7 +456,7 @@ class xfig():
     @param comment: The line of comment
     @type  comment: C{str}
     """
-    self.drawing += '#' + comment + "\n"
+    self.writeline('#' + comment)
     
   def writeline(self,line):
     """
@@ -411,17 +465,18 @@ class xfig():
     @param line: The line of output for xfig
     @type  line: C{str}
     """
-    self.drawing += line + "\n"
+    if self.stream != None:
+      self.stream.write(line + "\n")
+    else:
+      self.drawing.append(line + "\n")
 
-  def save(self,filename):
+  def writeheader(self,f):
     """
-    Write the drawing to a file
+    Write the header of the fig-file
 
-    @param filename: The complete filename to which the drawing has to be written
-    @type  filename: C{str}
+    @param f: The open file
+    @type  f: C{file}
     """
-    # write out some header
-    f = open(filename,mode='w')
     f.write('#FIG 3.2\n')
     f.write('# Created by FiloFax version 1.0\n')
     f.write(self.orientation + '\n')
@@ -432,5 +487,122 @@ class xfig():
     f.write(self.multiplepage + '\n')
     f.write(str(self.transparentcolor) + '\n')
     f.write(str(self.resolution) + ' ' + str(self.coord_system) + '\n')
-    f.write(self.drawing)
+
+  def open(self,filename):
+    """
+    Write the header to a file, and write everything drawn from now on directly to it,
+    instead of buffering it until save(). Anything already buffered is written first.
+    The header fields (paper, orientation, ...) have to be set before.
+
+    @param filename: The complete filename to which the drawing has to be written
+    @type  filename: C{str}
+    """
+    self.stream = open(filename,mode='w')
+    self.writeheader(self.stream)
+    self.stream.writelines(self.drawing)
+    self.drawing = []
+
+  def close(self):
+    """
+    Close the file opened with open()
+    """
+    self.stream.close()
+    self.stream = None
+
+  def save(self,filename):
+    """
+    Write the drawing to a file
+
+    @param filename: The complete filename to which the drawing has to be written
+    @type  filename: C{str}
+    """
+    # write out some header
+    f = open(filename,mode='w')
+    self.writeheader(f)
+    f.writelines(self.drawing)
     f.close()
+
+class xfigpage(xfig):
+  """
+  A page of a xfigdocument, with the drawing functions of pdfout: line widths in 1/72",
+  style 0 is solid and any other style is dashed, and fonts by their PostScript name.
+  Gray is ignored, everything is drawn in black.
+  """
+  # PostScript font name -> xfig font number
+  fontnumbers = {
+    "Times-Roman":0,
+    "Times-Italic":1,
+    "Times-Bold":2,
+    "Times-BoldItalic":3,
+    "Courier":12,
+    "Courier-Oblique":13,
+    "Courier-Bold":14,
+    "Courier-BoldOblique":15,
+    "Helvetica":16,
+    "Helvetica-Oblique":17,
+    "Helvetica-Bold":18,
+    "Helvetica-BoldOblique":19,
+    "Symbol":32,
+    "ZapfDingbats":34 }
+
+  def thickness(self,dikte):
+    """
+    Return the xfig thickness (1/80") of a line width in 1/72", at least 1
+
+    @param dikte: Thickness of the line in 1/72"
+    @type  dikte: C{float}
+
+    @rtype: C{int}
+    """
+    return max(1,int(round(dikte * 80 / 72.0)))
+
+  def line(self,fx,fy,dx,dy,style=0,dikte=1,gray=0):
+    xfig.line(self,fx,fy,dx,dy,min(style,1),self.thickness(dikte))
+
+  def circle(self,x,y,rad,style=0,dikte=1,gray=0):
+    xfig.circle(self,x,y,rad,min(style,1),self.thickness(dikte))
+
+  def tekst(self,x,y,text,font='Helvetica',fsize=12,align=0,gray=0):
+    xfig.tekst(self,x,y,text,self.fontnumbers.get(font,-1),fsize,align)
+
+  def image(self,filename,x,y,w = None,h = None):
+    # (x,y) is the lower left corner, like in pdfout
+    xfig.picture(self,filename,x,y-h,w,h)
+
+class xfigdocument(backend.document):
+  """
+  Write every page to its own fig-file, named basename_0000.fig, basename_0001.fig and so on.
+  The pages are written to the files while they are drawn.
+
+  @ivar basename: The start of the filenames
+  @type basename: C{str}
+
+  @ivar papersize: The xfig name of the paper
+  @type papersize: C{str}
+
+  @ivar orientation: "Landscape" or "Portrait"
+  @type orientation: C{str}
+  """
+  # names of the papers in filofaxDIY, which are different in xfig
+  papernames = {
+    "letter":"Letter",
+    "legal":"Legal",
+    "elevenSeventeen":"Tabloid" }
+
+  def __init__(self,basename,paper = "Letter",orient = "Portrait"):
+    self.basename = basename
+    self.papersize = self.papernames.get(paper,paper)
+    self.orientation = orient
+    self.pagecount = 0
+
+  def newpage(self,width,height):
+    page = xfigpage(self.papersize,self.orientation)
+    page.open("{base}_{nr:04d}.fig".format(base = self.basename,nr = self.pagecount))
+    self.pagecount += 1
+    return page
+
+  def savepage(self,page):
+    page.close()
+
+  def close(self):
+    pass